@@ -0,0 +1,327 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import resource
+import numpy as np
+import torch
+from .audio import SAMPLE_RATE, decode_audio, trim_silence
+from .workers import asr_pool
+from .fingerprint import audio_fingerprints, pcm_digest
+from . import threads
+
+# ==========================================
+# 🎤 WHISPER MODEL REGISTRY (Voice to Text)
+# ==========================================
+# One registry per process. Each model size is loaded once, either on the
+# first request that needs it or during an explicit warm-up, and then shared
+# by every router that does speech recognition.
+
+device = "cuda" if torch.cuda.is_available() else "cpu"
+
+AVAILABLE_SIZES = ("tiny", "base", "small", "medium", "large")
+DEFAULT_MODEL_SIZE = os.getenv("WHISPER_MODEL", "small")
+
+
+def current_rss_mb():
+    """Resident memory of this process in MB (Linux /proc, falls back to peak RSS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reports bytes, Linux reports KB
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return round(peak / divisor, 1)
+
+
+class WhisperRegistry:
+    def __init__(self, default_size=DEFAULT_MODEL_SIZE):
+        self.default_size = default_size
+        self._models = {}
+        self._stats = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def resolve_size(self, size=None):
+        size = (size or self.default_size).strip().lower()
+        if size not in AVAILABLE_SIZES:
+            raise ValueError(f"Unknown Whisper model size '{size}'. Choose one of {', '.join(AVAILABLE_SIZES)}.")
+        return size
+
+    def get(self, size=None):
+        """Return the loaded model for `size`, loading it on first use."""
+        size = self.resolve_size(size)
+        model = self._models.get(size)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            if size in self._models:
+                return self._models[size]
+
+            import whisper
+
+            print(f"🚀 Loading Whisper '{size}' model on {device}...")
+            rss_before = current_rss_mb()
+            started = time.perf_counter()
+            try:
+                model = whisper.load_model(size, device=device)
+            except Exception as e:
+                self._errors[size] = str(e)
+                print(f"⚠️ Whisper '{size}' load failed: {e}")
+                raise
+
+            load_seconds = round(time.perf_counter() - started, 2)
+            rss_after = current_rss_mb()
+            self._models[size] = model
+            self._errors.pop(size, None)
+            self._stats[size] = {
+                "device": device,
+                "load_seconds": load_seconds,
+                "rss_before_mb": rss_before,
+                "rss_after_mb": rss_after,
+                "rss_delta_mb": round(rss_after - rss_before, 1),
+                "loaded_at": time.time(),
+            }
+            print(f"✅ Whisper '{size}' ready in {load_seconds}s (+{self._stats[size]['rss_delta_mb']} MB RSS)")
+            return model
+
+    def is_loaded(self, size=None):
+        return self.resolve_size(size) in self._models
+
+    def warm_up(self, sizes=None):
+        """Load the given sizes (default model if omitted) ahead of traffic."""
+        for size in sizes or [self.default_size]:
+            try:
+                self.get(size)
+            except Exception:
+                # Already logged in get(); keep warming the remaining sizes
+                pass
+
+    def stats(self):
+        return {
+            "device": device,
+            "default_size": self.default_size,
+            "loaded": sorted(self._models),
+            "models": dict(self._stats),
+            "errors": dict(self._errors),
+            "process_rss_mb": current_rss_mb(),
+        }
+
+
+# Shared by app.main, app.inventory and any other module that needs ASR
+registry = WhisperRegistry()
+
+
+def get_model(size=None):
+    return registry.get(size)
+
+
+def warmup_sizes_from_env():
+    """Sizes listed in WHISPER_WARMUP (comma separated), e.g. 'small,base'."""
+    raw = os.getenv("WHISPER_WARMUP", "")
+    return [s.strip() for s in raw.split(",") if s.strip()]
+
+
+# ==========================================
+# 📦 MICRO-BATCHED TRANSCRIPTION QUEUE
+# ==========================================
+# Clips that arrive within a short window are padded to Whisper's 30s input,
+# stacked, and decoded in one forward pass. Every caller awaits its own
+# future, and the decode runs off the event loop so other requests keep
+# flowing while the encoder is busy.
+
+MAX_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "8"))
+MAX_BATCH_WAIT_MS = float(os.getenv("WHISPER_BATCH_WAIT_MS", "50"))
+LANGUAGE = "ne"
+VAD_TRIM = os.getenv("VAD_TRIM", "true").lower() in ("1", "true", "yes")  # crop silence, skip silent clips
+
+
+class _PendingClip:
+    __slots__ = ("audio", "size", "future")
+
+    def __init__(self, audio, size, future):
+        self.audio = audio
+        self.size = size
+        self.future = future
+
+
+class ASRBatcher:
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS, model_registry=None):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.registry = model_registry or registry
+        self._queue = None
+        self._worker = None
+        self.batches_run = 0
+        self.clips_done = 0
+        self.silent_clips = 0
+        self.trimmed_seconds = 0.0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, audio, size=None):
+        """
+        Queue one clip (raw upload bytes, 16 kHz float32 array or file path)
+        and wait for its transcription. Returns a dict shaped like whisper's transcribe() result.
+        """
+        size = self.registry.resolve_size(size)
+        with asr_pool.admit():  # raises PoolSaturated when the backlog is full
+            self._ensure_worker()
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put(_PendingClip(audio, size, future))
+            return await future
+
+    async def _collect(self):
+        first = await self._queue.get()
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+
+            # One decode per model size present in the window
+            by_size = {}
+            for clip in batch:
+                by_size.setdefault(clip.size, []).append(clip)
+
+            for size, clips in by_size.items():
+                try:
+                    results = await asr_pool.run_in_worker(self._decode_pinned, size, [c.audio for c in clips])
+                except Exception as e:
+                    for clip in clips:
+                        if not clip.future.done():
+                            clip.future.set_exception(e)
+                    continue
+
+                for clip, result in zip(clips, results):
+                    if clip.future.done():
+                        continue  # caller went away (cancelled request)
+                    if isinstance(result, Exception):
+                        clip.future.set_exception(result)
+                    else:
+                        clip.future.set_result(result)
+
+                self.batches_run += 1
+                self.clips_done += len(clips)
+
+    def _decode_pinned(self, size, clips):
+        with threads.pinned("asr"):  # Whisper's share of the torch thread budget
+            return self._decode_batch(size, clips)
+
+    def _decode_batch(self, size, clips):
+        import whisper
+
+        model = self.registry.get(size)
+        n_mels = model.dims.n_mels
+        results = [None] * len(clips)
+        mels, mel_index = [], []
+        fingerprints = {}
+
+        for i, audio in enumerate(clips):
+            try:
+                if isinstance(audio, (bytes, bytearray, memoryview)):
+                    audio = decode_audio(audio)
+                    # Uploads only: a retried upload decodes to the same PCM
+                    digest = pcm_digest(audio)
+                    cached = audio_fingerprints.get_transcript(digest, size)
+                    if cached is not None:
+                        results[i] = cached
+                        continue
+                    fingerprints[i] = digest
+                elif isinstance(audio, str):
+                    audio = whisper.load_audio(audio)
+                if VAD_TRIM:
+                    speech = trim_silence(np.asarray(audio, dtype=np.float32))
+                    self.trimmed_seconds += (len(audio) - len(speech)) / SAMPLE_RATE
+                    if len(speech) == 0:
+                        # Nothing but silence: don't let Whisper hallucinate a command
+                        self.silent_clips += 1
+                        results[i] = {"text": "", "language": LANGUAGE, "speech": False}
+                        continue
+                    audio = speech
+                if len(audio) > whisper.audio.N_SAMPLES:
+                    # Longer than one window: needs the sliding-window decoder
+                    results[i] = model.transcribe(audio, language=LANGUAGE, fp16=False)
+                    continue
+                # The encoder only takes a full 30 s window (openai-whisper asserts
+                # the shape), so a trimmed clip is padded back and costs the same.
+                # VAD_TRIM is not a latency win for clips with speech: it drops
+                # silent clips before Whisper (no hallucinated commands) and
+                # keeps clips that only run past 30 s on silence off the
+                # long-form decoder. Measurements: scripts/benchmark_vad.py.
+                audio = whisper.pad_or_trim(torch.as_tensor(audio, dtype=torch.float32))
+                mels.append(whisper.log_mel_spectrogram(audio, n_mels=n_mels))
+                mel_index.append(i)
+            except Exception as e:
+                results[i] = e
+
+        if mels:
+            options = whisper.DecodingOptions(language=LANGUAGE, fp16=False, without_timestamps=True)
+            with torch.no_grad():
+                decoded = whisper.decode(model, torch.stack(mels).to(model.device), options)
+            for i, res in zip(mel_index, decoded):
+                results[i] = {"text": res.text, "language": res.language}
+
+        for i, digest in fingerprints.items():
+            if isinstance(results[i], dict):
+                audio_fingerprints.put_transcript(digest, size, results[i])
+                results[i]["fingerprint"] = digest
+
+        return results
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "batches_run": self.batches_run,
+            "clips_done": self.clips_done,
+            "vad_trim": VAD_TRIM,
+            "silent_clips": self.silent_clips,
+            "trimmed_seconds": round(self.trimmed_seconds, 2),
+            "avg_batch_size": round(self.clips_done / self.batches_run, 2) if self.batches_run else 0.0,
+        }
+
+
+batcher = ASRBatcher()
+
+
+# ---------- OUT-OF-PROCESS MODE ----------
+# ASR_SERVICE_SOCKET set: Whisper lives in `python -m app.asr_service` and
+# this process only decodes uploads and ships the PCM (see app/asr_service.py)
+ASR_SERVICE_SOCKET = os.getenv("ASR_SERVICE_SOCKET", "").strip()
+_remote = None
+
+
+def remote_client():
+    global _remote
+    if ASR_SERVICE_SOCKET and _remote is None:
+        from .asr_service import RemoteASR
+        _remote = RemoteASR(ASR_SERVICE_SOCKET)
+    return _remote
+
+
+async def transcribe(audio, size=None):
+    remote = remote_client()
+    if remote is not None:
+        return await remote.transcribe(audio, size)
+    return await batcher.submit(audio, size)
@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import struct
+import asyncio
+import argparse
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+from .asr import registry, batcher, warmup_sizes_from_env
+from .audio import decode_audio
+from .workers import asr_pool, PoolSaturated
+from .fingerprint import audio_fingerprints, pcm_digest
+from . import threads
+
+# ==========================================
+# 🛰️ OUT-OF-PROCESS ASR SERVICE
+# ==========================================
+# Whisper can run in its own process instead of inside every web worker:
+#
+#   python -m app.asr_service --socket /tmp/asr.sock          # owns the models
+#   ASR_SERVICE_SOCKET=/tmp/asr.sock uvicorn app.main:app     # web tier
+#
+# With ASR_SERVICE_SOCKET set, app.asr.transcribe() becomes a thin client:
+# the web process decodes the upload to 16 kHz float32 PCM and the service
+# runs it through the usual micro-batcher. Web workers then stay small and
+# scale with HTTP traffic; the service scales with the ASR load.
+#
+# Wire format (Unix socket, one request per connection), each message is
+#   4-byte big-endian length + JSON header [+ inline payload]
+#
+#   request   {"op": "transcribe", "size": "small", "samples": N,
+#              "shm": "<name>" | null, "inline": <payload bytes>}
+#   response  {"result": {...}} | {"error": "...", "retry_after": s}
+#
+# Clips of at least ASR_SHM_MIN_BYTES go through a shared-memory segment:
+# the client writes the PCM once, the service reads it in place (no copy
+# through the socket), and the client unlinks it after the reply. Short
+# clips are cheaper to send inline.
+
+ASR_SERVICE_SOCKET = os.getenv("ASR_SERVICE_SOCKET", "").strip()
+SHM_MIN_BYTES = int(os.getenv("ASR_SHM_MIN_BYTES", "65536"))
+REQUEST_TIMEOUT = float(os.getenv("ASR_SERVICE_TIMEOUT", "120"))   # seconds
+HEADER = struct.Struct(">I")
+MAX_HEADER_BYTES = 1 << 20
+
+
+class ASRServiceError(Exception):
+    pass
+
+
+# ---------- FRAMING ----------
+async def _send(writer, header, payload=b""):
+    body = json.dumps(header).encode()
+    writer.write(HEADER.pack(len(body)) + body)
+    if payload:
+        writer.write(payload)
+    await writer.drain()
+
+
+async def _receive(reader):
+    (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_HEADER_BYTES:
+        raise ASRServiceError(f"Header too large ({length} bytes)")
+    return json.loads(await reader.readexactly(length))
+
+
+def _attach(name):
+    """Open the client's segment without adopting it (the client unlinks it)."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        segment = shared_memory.SharedMemory(name=name)
+        # Older Pythons register every attach and unlink it at exit
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+# ---------- SERVICE ----------
+class ASRService:
+    def __init__(self, path):
+        self.path = path
+        self.requests = 0
+        self.shm_requests = 0
+        self.errors = 0
+        self._lingering = []    # segments still referenced by a finished batch
+
+    def _close(self, segment):
+        try:
+            segment.close()
+        except BufferError:
+            self._lingering.append(segment)
+
+    def _close_lingering(self):
+        segments, self._lingering = self._lingering, []
+        for segment in segments:
+            self._close(segment)
+
+    async def handle(self, reader, writer):
+        segment = None
+        try:
+            request = await _receive(reader)
+            if request.get("op") == "stats":
+                await _send(writer, {"result": self.stats()})
+                return
+
+            self.requests += 1
+            self._close_lingering()
+            samples = int(request["samples"])
+            if request.get("shm"):
+                self.shm_requests += 1
+                segment = _attach(request["shm"])
+                audio = np.ndarray((samples,), dtype=np.float32, buffer=segment.buf)
+            else:
+                audio = np.frombuffer(await reader.readexactly(int(request["inline"])), dtype=np.float32)
+
+            try:
+                result = await batcher.submit(audio, request.get("size"))
+                reply = {"result": result}
+            except PoolSaturated as e:
+                reply = {"error": str(e), "retry_after": e.retry_after}
+            except Exception as e:
+                self.errors += 1
+                reply = {"error": str(e)}
+            del audio
+            await _send(writer, reply)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # client went away
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ ASR service request failed: {e}")
+        finally:
+            if segment is not None:
+                self._close(segment)
+            writer.close()
+
+    def stats(self):
+        return {
+            "socket": self.path,
+            "pid": os.getpid(),
+            "requests": self.requests,
+            "shm_requests": self.shm_requests,
+            "errors": self.errors,
+            "batcher": batcher.stats(),
+            "pool": asr_pool.stats(),
+            "threads": threads.stats(),
+            "models": registry.stats(),
+        }
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket from a previous run
+        server = await asyncio.start_unix_server(self.handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        print(f"🛰️ ASR service listening on {self.path}")
+        async with server:
+            await server.serve_forever()
+
+
+# ---------- CLIENT (web tier) ----------
+class RemoteASR:
+    def __init__(self, path=ASR_SERVICE_SOCKET, shm_min_bytes=SHM_MIN_BYTES, timeout=REQUEST_TIMEOUT):
+        self.path = path
+        self.shm_min_bytes = shm_min_bytes
+        self.timeout = timeout
+        self.requests = 0
+        self.failures = 0
+        self.round_trip_seconds = 0.0
+
+    def _prepare(self, audio, size):
+        # Worker thread: decode the upload here so only PCM crosses the socket
+        digest = None
+        if isinstance(audio, str):
+            with open(audio, "rb") as f:
+                audio = f.read()
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = decode_audio(audio)
+            digest = pcm_digest(audio)
+            cached = audio_fingerprints.get_transcript(digest, size)
+            if cached is not None:
+                return None, None, cached
+        return np.ascontiguousarray(audio, dtype=np.float32), digest, None
+
+    async def transcribe(self, audio, size=None):
+        size = registry.resolve_size(size)
+        with asr_pool.admit():  # same 429 backpressure as in-process decoding
+            pcm, digest, cached = await asr_pool.run_in_worker(self._prepare, audio, size)
+            if cached is not None:
+                return cached
+            result = await asyncio.wait_for(self._request(pcm, size), self.timeout)
+
+        if digest is not None:
+            audio_fingerprints.put_transcript(digest, size, result)
+            result["fingerprint"] = digest
+        return result
+
+    async def _request(self, pcm, size):
+        segment = None
+        started = time.perf_counter()
+        self.requests += 1
+        try:
+            header = {"op": "transcribe", "size": size, "samples": len(pcm), "shm": None, "inline": 0}
+            payload = b""
+            if pcm.nbytes >= self.shm_min_bytes:
+                segment = shared_memory.SharedMemory(create=True, size=pcm.nbytes)
+                np.ndarray(pcm.shape, dtype=np.float32, buffer=segment.buf)[:] = pcm
+                header["shm"] = segment.name
+            else:
+                payload = pcm.tobytes()
+                header["inline"] = len(payload)
+
+            reply = await self._call(header, payload)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self.failures += 1
+            raise ASRServiceError(f"ASR service unavailable at {self.path}: {e}") from e
+        finally:
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+            self.round_trip_seconds += time.perf_counter() - started
+
+        if "retry_after" in reply:
+            raise PoolSaturated("asr", reply["retry_after"])
+        if "error" in reply:
+            self.failures += 1
+            raise ASRServiceError(reply["error"])
+        return reply["result"]
+
+    async def _call(self, header, payload=b""):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        try:
+            await _send(writer, header, payload)
+            return await _receive(reader)
+        finally:
+            writer.close()
+
+    async def remote_stats(self):
+        try:
+            return (await asyncio.wait_for(self._call({"op": "stats"}), 5))["result"]
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            return {"error": f"unreachable: {e}"}
+
+    def stats(self):
+        return {
+            "socket": self.path,
+            "requests": self.requests,
+            "failures": self.failures,
+            "avg_round_trip_ms": round(self.round_trip_seconds / self.requests * 1000, 2) if self.requests else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Whisper transcription over a Unix socket.")
+    parser.add_argument("--socket", default=ASR_SERVICE_SOCKET or "/tmp/nepali-asr.sock")
+    parser.add_argument("--warmup", default=None, help="model sizes to load first (default: WHISPER_WARMUP or the default size)")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op budget (default: TORCH_THREADS or all usable cores)")
+    args = parser.parse_args()
+
+    # This process runs Whisper only: it gets the whole budget
+    threads.configure(budget=args.threads or threads.cpu_budget(worker_processes=1), stages=("asr",))
+
+    sizes = [s.strip() for s in args.warmup.split(",") if s.strip()] if args.warmup else warmup_sizes_from_env()
+    registry.warm_up(sizes or None)
+    try:
+        asyncio.run(ASRService(args.socket).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
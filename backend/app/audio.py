@@ -0,0 +1,208 @@
+import io
+import os
+import struct
+import numpy as np
+
+# ==========================================
+# 🔊 IN-MEMORY AUDIO DECODING
+# ==========================================
+# Uploads are decoded straight from the request bytes into the 16 kHz mono
+# float32 array Whisper expects. WAV/PCM is parsed here; anything else goes
+# through PyAV's in-process streaming decoder. No temp files, no ffmpeg
+# subprocess.
+
+SAMPLE_RATE = 16000
+
+try:
+    import av
+except ImportError:
+    av = None
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioDecodeError(ValueError):
+    pass
+
+
+def decode_audio(data, sr=SAMPLE_RATE):
+    """Decode uploaded bytes (WAV, m4a, mp3, ...) into a mono float32 array at `sr` Hz."""
+    if not data:
+        raise AudioDecodeError("Empty audio upload")
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        samples, source_sr = parse_wav(data)
+    else:
+        samples, source_sr = _decode_container(data, sr)
+
+    return resample(samples, source_sr, sr)
+
+
+def parse_wav(data):
+    """Parse a RIFF/WAVE byte string. Returns (mono float32 samples, sample rate)."""
+    view = memoryview(data)
+    pos = 12
+    fmt = None
+    pcm = None
+
+    while pos + 8 <= len(view):
+        chunk_id = bytes(view[pos:pos + 4])
+        chunk_size = struct.unpack_from("<I", view, pos + 4)[0]
+        body_start = pos + 8
+        body_end = min(body_start + chunk_size, len(view))
+
+        if chunk_id == b"fmt ":
+            fmt_tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", view, body_start)
+            if fmt_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # Real format lives in the first 2 bytes of the SubFormat GUID
+                fmt_tag = struct.unpack_from("<H", view, body_start + 24)[0]
+            fmt = (fmt_tag, channels, rate, bits)
+        elif chunk_id == b"data":
+            pcm = view[body_start:body_end]
+            if fmt is not None:
+                break
+
+        # Chunks are word aligned
+        pos = body_start + chunk_size + (chunk_size & 1)
+
+    if fmt is None or pcm is None:
+        raise AudioDecodeError("WAV file has no fmt/data chunk")
+
+    fmt_tag, channels, rate, bits = fmt
+    samples = _pcm_to_float32(pcm, fmt_tag, bits)
+
+    if channels > 1:
+        usable = len(samples) - (len(samples) % channels)
+        samples = samples[:usable].reshape(-1, channels).mean(axis=1)
+
+    return samples.astype(np.float32, copy=False), rate
+
+
+def _pcm_to_float32(pcm, fmt_tag, bits):
+    if fmt_tag == WAVE_FORMAT_IEEE_FLOAT:
+        if bits == 32:
+            return np.frombuffer(pcm, dtype="<f4", count=len(pcm) // 4)
+        if bits == 64:
+            return np.frombuffer(pcm, dtype="<f8", count=len(pcm) // 8).astype(np.float32)
+
+    if fmt_tag == WAVE_FORMAT_PCM:
+        if bits == 8:
+            # 8-bit WAV is unsigned
+            raw = np.frombuffer(pcm, dtype=np.uint8)
+            return (raw.astype(np.float32) - 128.0) / 128.0
+        if bits == 16:
+            raw = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+            return raw.astype(np.float32) / 32768.0
+        if bits == 24:
+            raw = np.frombuffer(pcm, dtype=np.uint8, count=(len(pcm) // 3) * 3).reshape(-1, 3)
+            ints = (raw[:, 0].astype(np.int32)
+                    | (raw[:, 1].astype(np.int32) << 8)
+                    | (raw[:, 2].astype(np.int32) << 16))
+            ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+            return ints.astype(np.float32) / 8388608.0
+        if bits == 32:
+            raw = np.frombuffer(pcm, dtype="<i4", count=len(pcm) // 4)
+            return raw.astype(np.float32) / 2147483648.0
+
+    raise AudioDecodeError(f"Unsupported WAV encoding (format {fmt_tag}, {bits}-bit)")
+
+
+def _decode_container(data, sr):
+    """Stream-decode compressed containers (m4a/aac, mp3, ogg, webm) with PyAV."""
+    if av is None:
+        raise AudioDecodeError("Non-WAV upload needs PyAV ('pip install av')")
+
+    chunks = []
+    try:
+        with av.open(io.BytesIO(data), mode="r") as container:
+            resampler = av.AudioResampler(format="flt", layout="mono", rate=sr)
+            for frame in container.decode(audio=0):
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+            # Flush samples still buffered in the resampler
+            for out in resampler.resample(None):
+                chunks.append(out.to_ndarray().reshape(-1))
+    except av.error.FFmpegError as e:
+        raise AudioDecodeError(f"Could not decode audio: {e}") from e
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32), sr
+    return np.concatenate(chunks).astype(np.float32, copy=False), sr
+
+
+def resample(samples, source_sr, target_sr=SAMPLE_RATE):
+    if source_sr == target_sr or len(samples) == 0:
+        return np.ascontiguousarray(samples, dtype=np.float32)
+    if soxr is not None:
+        return soxr.resample(samples, source_sr, target_sr).astype(np.float32, copy=False)
+
+    # Linear interpolation fallback (fine for speech, soxr is preferred)
+    duration = len(samples) / float(source_sr)
+    n_out = int(round(duration * target_sr))
+    src_t = np.arange(len(samples), dtype=np.float64) / source_sr
+    dst_t = np.arange(n_out, dtype=np.float64) / target_sr
+    return np.interp(dst_t, src_t, samples).astype(np.float32)
+
+
+def pcm16_to_float32(chunk):
+    """Raw little-endian 16-bit mono PCM (as streamed by the app) -> float32 in [-1, 1]."""
+    return _pcm_to_float32(chunk, WAVE_FORMAT_PCM, 16)
+
+
+# ---------- ENERGY ----------
+def frame_levels_db(samples, frame_len):
+    """RMS level (dBFS) of each whole `frame_len`-sample frame, in one vectorised pass."""
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(samples[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+    power = np.einsum("ij,ij->i", frames, frames) / frame_len
+    return (10.0 * np.log10(power + 1e-10)).astype(np.float32)
+
+
+# ---------- VOICE ACTIVITY TRIMMING ----------
+# Live uploads carry the silence before and after the command (the mic
+# opens before the shopkeeper speaks). Same idea as the offline
+# librosa.effects.trim in scripts/preprocess_audio.py, but vectorised NumPy
+# on the request path: frames quieter than max(peak - VAD_TOP_DB, VAD_MIN_DB)
+# are silence, the span from the first to the last loud frame is kept.
+VAD_FRAME_MS = 20
+VAD_MIN_DB = float(os.getenv("VAD_MIN_DB", "-45"))       # absolute floor: quieter is never speech
+VAD_TOP_DB = float(os.getenv("VAD_TOP_DB", "30"))        # relative to the loudest frame
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "150"))         # keep soft onsets / endings
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "100"))
+
+
+def speech_bounds(samples, sr=SAMPLE_RATE):
+    """(start, end) sample indices of the speech span, or None if the clip is silent."""
+    frame_len = max(1, sr * VAD_FRAME_MS // 1000)
+    levels = frame_levels_db(samples, frame_len)
+    if len(levels) == 0:
+        return None
+
+    peak = float(levels.max())
+    if peak < VAD_MIN_DB:
+        return None
+    loud = np.flatnonzero(levels >= max(peak - VAD_TOP_DB, VAD_MIN_DB))
+    if len(loud) * VAD_FRAME_MS < VAD_MIN_SPEECH_MS:
+        return None
+
+    pad = sr * VAD_PAD_MS // 1000
+    start = max(0, int(loud[0]) * frame_len - pad)
+    end = min(len(samples), (int(loud[-1]) + 1) * frame_len + pad)
+    return start, end
+
+
+def trim_silence(samples, sr=SAMPLE_RATE):
+    """Crop leading/trailing silence. Returns an empty array when there is no speech."""
+    bounds = speech_bounds(samples, sr)
+    if bounds is None:
+        return samples[:0]
+    return samples[bounds[0]:bounds[1]]
@@ -1,9 +1,15 @@
 import os
+import re
+import time
 import torch
 import pickle
-import re
-from transformers import AutoTokenizer, DistilBertForSequenceClassification
-from app.nepali_mapping import ITEM_MAP, UNIT_MAP, NEPALI_NUM_MAP
+import threading
+import unicodedata
+from collections import OrderedDict
+from transformers import AutoTokenizer
+from app.entity_matcher import get_matcher, ITEM, UNIT, NUMBER, DIGIT
+from app.classifier import load_classifier, DEFAULT_BACKEND, ONNX_FILENAME
+from app import threads
 
 # -----------------------------
 # 1️⃣ INITIALIZATION
@@ -11,79 +17,97 @@ from app.nepali_mapping import ITEM_MAP, UNIT_MAP, NEPALI_NUM_MAP
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MODEL_PATH = os.path.join(BASE_DIR, "bert_brain_model")
 
-print(f"🧠 BRAIN: Initializing from {MODEL_PATH}...")
-
 device = "cuda" if torch.cuda.is_available() else "cpu"
 tokenizer = None
-model = None
+classifier = None
 id_to_label = {}
 BERT_READY = False
+model_signature = None
 
-try:
-    # Load the Tokenizer
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-    
-    # Load the Model (Safe Mode: ignores mismatched sizes if you retrain often)
-    model = DistilBertForSequenceClassification.from_pretrained(
-        MODEL_PATH, 
-        ignore_mismatched_sizes=True
-    )
-    model.to(device)
-    model.eval()
-    
-    # Load the Labels
-    with open(os.path.join(MODEL_PATH, "label_map.pkl"), "rb") as f:
-        id_to_label = pickle.load(f)
+def _is_derived(name):
+    return name.endswith(".onnx") or (ONNX_FILENAME in name and name.endswith(".tmp"))
+
+def _model_signature():
+    # Name, size and mtime of every file in bert_brain_model/ (changes when the model is swapped).
+    # The ONNX graph (and its .tmp while exporting) is derived from the weights, so it doesn't count.
+    try:
+        with os.scandir(MODEL_PATH) as entries:
+            return tuple(sorted(
+                (e.name, e.stat().st_size, e.stat().st_mtime_ns) for e in entries
+                if e.is_file() and not _is_derived(e.name)
+            ))
+    except OSError:
+        return ()
+
+def load_brain():
+    global tokenizer, classifier, id_to_label, BERT_READY, model_signature
+    print(f"🧠 BRAIN: Initializing from {MODEL_PATH}...")
+    BERT_READY = False
+    try:
+        # Load the Tokenizer
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
         
-    BERT_READY = True
-    print("✅ BRAIN: BERT Model is Online & Ready.")
-except Exception as e:
-    print(f"⚠️ BRAIN: BERT failed to load. Reason: {e}")
-    print("⚠️ BRAIN: Switching to RULE-BASED fallback mode.")
+        # Load the Model through the configured backend (BRAIN_BACKEND=torch|int8|onnx)
+        classifier = load_classifier(MODEL_PATH, tokenizer, DEFAULT_BACKEND, device)
+        
+        # Load the Labels
+        with open(os.path.join(MODEL_PATH, "label_map.pkl"), "rb") as f:
+            id_to_label = pickle.load(f)
+            
+        BERT_READY = True
+        print(f"✅ BRAIN: BERT Model is Online & Ready ({classifier.name} backend).")
+    except Exception as e:
+        print(f"⚠️ BRAIN: BERT failed to load. Reason: {e}")
+        print("⚠️ BRAIN: Switching to RULE-BASED fallback mode.")
+    # Taken after loading: the ONNX backend may have just exported model.onnx
+    model_signature = _model_signature()
+
+load_brain()
 
 # -----------------------------
 # 2️⃣ LOGIC: EXTRACTION
 # -----------------------------
-def extract_quantity(text):
-    text = text.lower()
-    
-    # A. Check for known word-numbers (e.g., "dedh", "pachas")
-    for word, val in NEPALI_NUM_MAP.items():
-        # strict word boundary check to avoid matching "tin" inside "martin"
-        if re.search(r'\b' + re.escape(word) + r'\b', text):
-            return float(val)
-            
-    # B. Check for digits (e.g., "5", "10.5")
-    digit_match = re.search(r"(\d+(\.\d+)?)", text)
-    if digit_match:
-        return float(digit_match.group(1))
-        
+def _quantity_from_spans(spans):
+    # A. Known word-numbers (e.g., "dedh", "pachas") win over digits
+    for _, _, kind, value in spans:
+        if kind == NUMBER:
+            return float(value)
+
+    # B. Digits (e.g., "5", "10.5")
+    for _, _, kind, value in spans:
+        if kind == DIGIT:
+            return value
+
     return 1.0 # Default fallback
 
-def extract_details(text):
-    text = text.lower()
+def _details_from_spans(spans):
     found_item = None
     found_unit = "unit" # Default
-    
-    # Find Item (Longest match first to catch 'sunflower oil' before 'oil')
-    sorted_items = sorted(ITEM_MAP.keys(), key=len, reverse=True)
-    for nepali_key in sorted_items:
-        if nepali_key in text:
-            found_item = ITEM_MAP[nepali_key]
-            break
-            
-    # Find Unit
-    for nepali_unit, english_unit in UNIT_MAP.items():
-        if nepali_unit in text:
-            found_unit = english_unit
+
+    # Longest item key wins (catch 'chiyapatti' before 'chiya')
+    best_len = 0
+    for start, end, kind, value in spans:
+        if kind == ITEM and end - start > best_len:
+            found_item, best_len = value, end - start
+
+    # First unit mentioned
+    for _, _, kind, value in spans:
+        if kind == UNIT:
+            found_unit = value
             break
-            
+
     return found_item, found_unit
 
+def extract_quantity(text):
+    return _quantity_from_spans(get_matcher().find(text))
+
+def extract_details(text):
+    return _details_from_spans(get_matcher().find(text))
+
 # -----------------------------
 # 3️⃣ LOGIC: PREDICTION
 # -----------------------------
-def process_command(text):
+def _analyse(text, probs):
     response = {
         "intent": "UNKNOWN",
         "item": None,
@@ -93,8 +117,10 @@ def process_command(text):
     }
     
     # Step 1: Extract Entities (Item, Qty, Unit)
-    response["quantity"] = extract_quantity(text)
-    item, unit = extract_details(text)
+    # (one pass of the compiled matcher finds items, units and numbers)
+    spans = get_matcher().find(text)
+    response["quantity"] = _quantity_from_spans(spans)
+    item, unit = _details_from_spans(spans)
     response["item"] = item
     response["unit"] = unit
 
@@ -103,18 +129,13 @@ def process_command(text):
     conf = 0.0
 
     # PLAN A: Ask BERT
-    if BERT_READY:
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=64).to(device)
-        with torch.no_grad():
-            outputs = model(**inputs)
-        
-        probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-        conf_score, pred_idx = torch.max(probs, dim=1)
-        conf = round(conf_score.item(), 4)
+    if probs is not None:
+        pred_idx = int(probs.argmax())
+        conf = round(float(probs[pred_idx]), 4)
         
         # Threshold Check: If BERT is < 60% sure, don't trust it.
         if conf > 0.60:
-            intent = id_to_label.get(pred_idx.item(), "UNKNOWN")
+            intent = id_to_label.get(pred_idx, "UNKNOWN")
 
     # PLAN B: Rule Fallback (If BERT is dead or confused)
     if intent == "UNKNOWN":
@@ -133,4 +154,143 @@ def process_command(text):
     response["confidence"] = conf
     
     print(f"🧠 Analysis: {text} -> {response['intent']} ({response['confidence']*100}%) | Item: {response['item']}")
-    return response
\ No newline at end of file
+    return response
+
+# -----------------------------
+# 4️⃣ PARSE CACHE
+# -----------------------------
+# Shopkeepers repeat the same few phrases all day. The intent + entity parse
+# of an utterance is memoised on its normalised text, so a repeat skips the
+# tokenizer and BERT. Only the parse is cached: stock is always read live by
+# the caller (CHECK answers stay current).
+CACHE_SIZE = int(os.getenv("BRAIN_CACHE_SIZE", "2048"))
+CACHE_TTL = float(os.getenv("BRAIN_CACHE_TTL", "3600"))             # seconds
+MODEL_CHECK_INTERVAL = float(os.getenv("BRAIN_MODEL_CHECK_S", "10"))  # how often to stat bert_brain_model/
+NLU_BATCH_SIZE = max(1, int(os.getenv("NLU_BATCH_SIZE", "64")))       # texts per padded BERT pass
+
+_SPACES = re.compile(r"\s+")
+_EDGE_PUNCT = "?!।॥,.\"' "
+
+def normalize_nepali(text):
+    """NFC, single spaces, no edge punctuation (।, ?, ...), lower-cased Latin."""
+    text = unicodedata.normalize("NFC", text or "")
+    return _SPACES.sub(" ", text).strip(_EDGE_PUNCT).lower()
+
+# Same text -> same parse
+cache_key = normalize_nepali
+
+class ParseCache:
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_size = max(0, int(max_size))
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (stored_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+parse_cache = ParseCache()
+_cache_state = {"checked_at": time.monotonic(), "matcher": None}
+_reload_lock = threading.Lock()
+
+def _check_for_changes():
+    """Reload the model if bert_brain_model/ changed; drop cached parses if the model or vocab did."""
+    now = time.monotonic()
+    if now - _cache_state["checked_at"] >= MODEL_CHECK_INTERVAL:
+        _cache_state["checked_at"] = now
+        if _model_signature() != model_signature:
+            with _reload_lock:
+                if _model_signature() != model_signature:
+                    print("🔄 BRAIN: Model files changed, reloading.")
+                    load_brain()
+                    parse_cache.clear()
+
+    # Vocabulary reloads (entity_matcher.reload_mappings) build a new matcher
+    matcher = get_matcher()
+    if matcher is not _cache_state["matcher"]:
+        if _cache_state["matcher"] is not None:
+            parse_cache.clear()
+        _cache_state["matcher"] = matcher
+
+# -----------------------------
+# 5️⃣ ENTRY POINTS
+# -----------------------------
+def process_commands(texts):
+    """Analyse many utterances: cached parses are reused, the rest go through BERT NLU_BATCH_SIZE at a time."""
+    texts = list(texts)
+    if not texts:
+        return []
+    _check_for_changes()
+
+    keys = [cache_key(text) for text in texts]
+    results = [parse_cache.get(key) for key in keys]
+
+    # First text seen for each uncached key
+    pending = {}
+    for i, (key, result) in enumerate(zip(keys, results)):
+        if result is None and key not in pending:
+            pending[key] = i
+
+    if pending:
+        todo = [texts[i] for i in pending.values()]
+        if BERT_READY:
+            # Chunked so one big batch can't build a huge padded tensor
+            all_probs = []
+            with threads.pinned("nlu"):  # BERT's share of the torch thread budget (app/threads.py)
+                for start in range(0, len(todo), NLU_BATCH_SIZE):
+                    all_probs.extend(classifier.predict(todo[start:start + NLU_BATCH_SIZE]))
+        else:
+            all_probs = [None] * len(todo)
+        fresh = {}
+        for key, text, probs in zip(pending, todo, all_probs):
+            fresh[key] = _analyse(text, probs)
+            parse_cache.put(key, fresh[key])
+        results = [result if result is not None else fresh[key] for key, result in zip(keys, results)]
+
+    # Callers get their own copy (they may add fields to it)
+    return [dict(result) for result in results]
+
+def process_command(text):
+    return process_commands([text])[0]
@@ -0,0 +1,144 @@
+import os
+from datetime import datetime
+from sqlalchemy import event, select, func, literal_column, text
+from sqlalchemy.orm import object_session
+
+from . import models
+from .database import engine
+
+# ==========================================
+# 🏷️ CATALOGUE VERSIONS (/products sync)
+# ==========================================
+# Every product change stamps its row with a new catalogue version, drawn
+# by the writing statement itself:
+#
+#   Postgres   nextval('catalog_version_seq')  (no row lock: concurrent
+#              stock writes to different products don't queue)
+#   SQLite     catalog_clock + 1, and the writer then advances the clock
+#              with advance(); SQLite runs one writer at a time
+#
+# Neither ever hands out a version twice, so a deleted product can't
+# take the catalogue back to an older version. A guarded sale that finds
+# too little stock updates no row, so it draws no version and leaves the
+# ETag alone. Deleting a product draws a version too, for its tombstone
+# in catalog_deletions. A tablet that last saw version N gets the rows
+# with version > N from /products?since=N, and the ids deleted since then
+# in the X-Deleted-Products header. It should apply those deletions
+# before the rows (an id can be reused by a later product).
+#
+# On Postgres, sequence values are handed out at UPDATE time but become
+# visible at COMMIT, so two overlapping writes can commit out of order.
+# /products?since= therefore re-sends the last CATALOG_SYNC_OVERLAP
+# versions. Re-sent rows are plain upserts for the client.
+#
+# The current version, the highest version on a product or a tombstone
+# (two index reads), doubles as the weak ETag of the catalogue: when it
+# hasn't moved, /products answers 304 without reading the product rows.
+
+SEQUENCE_NAME = "catalog_version_seq"
+USE_SEQUENCE = engine.dialect.name == "postgresql"
+SYNC_OVERLAP = int(os.getenv("CATALOG_SYNC_OVERLAP", "100" if USE_SEQUENCE else "0"))
+
+
+# Last version issued on SQLite. Before the clock row exists (a database
+# created before it), the newest product version stands in for it.
+_CLOCK_SQL = (
+    "COALESCE((SELECT version FROM catalog_clock WHERE id = 1),"
+    " (SELECT COALESCE(MAX(version), 0) FROM inventory))"
+)
+
+
+def next_version_sql():
+    """SQL expression for a new version, for use inside the UPDATE/INSERT that writes the row."""
+    if USE_SEQUENCE:
+        return f"nextval('{SEQUENCE_NAME}')"
+    return f"({_CLOCK_SQL} + 1)"
+
+
+def next_version():
+    return literal_column(next_version_sql())
+
+
+def advance(connection):
+    """
+    Call after each statement that used next_version_sql() and wrote a row.
+    Moves the SQLite clock past the version just drawn; the Postgres
+    sequence has already moved.
+    """
+    if USE_SEQUENCE:
+        return
+    connection.execute(text(
+        f"INSERT INTO catalog_clock (id, version) VALUES (1, {next_version_sql()}) "
+        "ON CONFLICT (id) DO UPDATE SET version = catalog_clock.version + 1"
+    ))
+
+
+def current_version(db):
+    latest = db.execute(select(func.max(models.Product.version))).scalar() or 0
+    deleted = db.execute(select(func.max(models.CatalogDeletion.version))).scalar() or 0
+    return max(latest, deleted)
+
+
+def deleted_since(db, since):
+    """Ids of products deleted after version `since` (with the same overlap as the rows)."""
+    return db.execute(
+        select(models.CatalogDeletion.product_id)
+        .where(models.CatalogDeletion.version > since_floor(since))
+        .order_by(models.CatalogDeletion.product_id)
+    ).scalars().all()
+
+
+def since_floor(since):
+    """Lowest version /products?since= must return (see SYNC_OVERLAP)."""
+    return max(0, since - SYNC_OVERLAP)
+
+
+def etag(version, since=None):
+    return f'W/"{version}"' if since is None else f'W/"{version}-{since}"'
+
+
+def etag_matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same validator
+    wanted = tag[2:] if tag.startswith("W/") else tag
+    return any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == wanted
+        for candidate in (c.strip() for c in if_none_match.split(","))
+    )
+
+
+# ---------- ORM WRITES (seed, price edits, new products) ----------
+@event.listens_for(models.Product, "before_insert")
+@event.listens_for(models.Product, "before_update")
+def _stamp_product(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target in session.dirty and not session.is_modified(target, include_collections=False):
+        return  # flushed without a real column change
+    # Evaluated by the INSERT/UPDATE itself; reloaded from the row on access
+    target.version = next_version()
+    target.updated_at = datetime.utcnow()
+
+
+@event.listens_for(models.Product, "after_insert")
+@event.listens_for(models.Product, "after_update")
+def _advance_clock(mapper, connection, target):
+    # Also runs after a flush that changed nothing: that leaves a gap in
+    # the versions, never a reused one
+    advance(connection)
+
+
+@event.listens_for(models.Product, "before_delete")
+def _record_deletion(mapper, connection, target):
+    # Drawn while the row still exists, so the tombstone is newer than it
+    connection.execute(
+        text(
+            "INSERT INTO catalog_deletions (product_id, version, deleted_at) "
+            f"VALUES (:id, {next_version_sql()}, :now) "
+            "ON CONFLICT (product_id) DO UPDATE SET version = excluded.version, deleted_at = excluded.deleted_at"
+        ),
+        {"id": target.id, "now": datetime.utcnow()},
+    )
+    advance(connection)
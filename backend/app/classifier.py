@@ -0,0 +1,159 @@
+import os
+import time
+import numpy as np
+import torch
+from transformers import DistilBertForSequenceClassification
+
+# ==========================================
+# 🧠 INTENT CLASSIFIER BACKENDS
+# ==========================================
+# Same tokenizer, same label map, three ways to run the forward pass:
+#   "torch" -> fp32 eager PyTorch (the original behaviour)
+#   "int8"  -> torch dynamic int8 quantisation of every nn.Linear (CPU)
+#   "onnx"  -> exported graph on ONNX Runtime (CPU)
+# Pick one with BRAIN_BACKEND. All backends return softmax probabilities.
+
+BACKENDS = ("torch", "int8", "onnx")
+DEFAULT_BACKEND = os.getenv("BRAIN_BACKEND", "torch").strip().lower()
+MAX_LEN = 64
+ONNX_FILENAME = "model.onnx"
+WEIGHT_FILENAMES = ("model.safetensors", "pytorch_model.bin")
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def load_torch_model(model_path, device="cpu"):
+    # Safe Mode: ignores mismatched sizes if you retrain often
+    model = DistilBertForSequenceClassification.from_pretrained(
+        model_path,
+        ignore_mismatched_sizes=True
+    )
+    model.to(device)
+    model.eval()
+    return model
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model_path, tokenizer, device="cpu"):
+        self.tokenizer = tokenizer
+        self.device = device
+        self.model = load_torch_model(model_path, device)
+
+    def predict(self, texts):
+        """Return an (n_texts, n_labels) array of probabilities."""
+        inputs = self.tokenizer(texts, return_tensors="pt", truncation=True, padding=True, max_length=MAX_LEN).to(self.device)
+        with torch.no_grad():
+            logits = self.model(**inputs).logits
+        return torch.nn.functional.softmax(logits, dim=-1).cpu().numpy()
+
+
+class Int8Backend(TorchBackend):
+    name = "int8"
+
+    def __init__(self, model_path, tokenizer, device="cpu"):
+        # Dynamic quantisation kernels are CPU only
+        super().__init__(model_path, tokenizer, "cpu")
+        if device != "cpu":
+            print("⚠️ BRAIN: int8 backend runs on CPU, ignoring CUDA.")
+        self.model = torch.ao.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, model_path, tokenizer, device="cpu"):
+        if ort is None:
+            raise ImportError("onnxruntime is not installed ('pip install onnxruntime')")
+        self.tokenizer = tokenizer
+        onnx_path = os.path.join(model_path, ONNX_FILENAME)
+        if onnx_is_stale(model_path, onnx_path):
+            # Fallback only: run scripts/export_onnx.py at deploy time so workers don't each export
+            print(f"📦 BRAIN: {ONNX_FILENAME} missing or older than the weights, exporting one now...")
+            export_onnx(model_path, tokenizer, onnx_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def predict(self, texts):
+        inputs = self.tokenizer(texts, return_tensors="np", truncation=True, padding=True, max_length=MAX_LEN)
+        feed = {k: v.astype(np.int64) for k, v in inputs.items() if k in self.input_names}
+        logits = self.session.run(["logits"], feed)[0]
+        return _softmax(logits)
+
+
+def onnx_is_stale(model_path, onnx_path=None):
+    """True if the ONNX graph is missing or older than any of the weight files it was exported from."""
+    onnx_path = onnx_path or os.path.join(model_path, ONNX_FILENAME)
+    if not os.path.exists(onnx_path):
+        return True
+    exported_at = os.path.getmtime(onnx_path)
+    for name in WEIGHT_FILENAMES:
+        weights = os.path.join(model_path, name)
+        if os.path.exists(weights) and os.path.getmtime(weights) > exported_at:
+            return True
+    return False
+
+
+def export_onnx(model_path, tokenizer, onnx_path=None):
+    """Export the fine-tuned DistilBERT to ONNX with dynamic batch & sequence axes."""
+    onnx_path = onnx_path or os.path.join(model_path, ONNX_FILENAME)
+    model = load_torch_model(model_path, "cpu")
+    sample = tokenizer(["चिनी ५ किलो थप"], return_tensors="pt", padding=True, truncation=True, max_length=MAX_LEN)
+
+    # Write next to the target and rename, so a concurrent loader never sees half a file
+    tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    started = time.perf_counter()
+    try:
+        _export_graph(model, sample, tmp_path)
+        os.replace(tmp_path, onnx_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"✅ BRAIN: Exported {onnx_path} in {time.perf_counter() - started:.1f}s")
+    return onnx_path
+
+
+def _export_graph(model, sample, path):
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+
+
+_BACKEND_CLASSES = {
+    "torch": TorchBackend,
+    "int8": Int8Backend,
+    "onnx": OnnxBackend,
+}
+
+
+def load_classifier(model_path, tokenizer, backend=None, device="cpu"):
+    backend = (backend or DEFAULT_BACKEND).strip().lower()
+    if backend not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown BRAIN_BACKEND '{backend}'. Choose one of {', '.join(BACKENDS)}.")
+    return _BACKEND_CLASSES[backend](model_path, tokenizer, device)
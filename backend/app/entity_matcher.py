@@ -0,0 +1,83 @@
+import re
+import importlib
+from app import nepali_mapping
+
+# ==========================================
+# 🔎 COMPILED ENTITY MATCHER
+# ==========================================
+# Every key from ITEM_MAP, UNIT_MAP and NEPALI_NUM_MAP goes into ONE regex
+# alternation (longest keys first), plus a digit pattern. A single finditer()
+# pass over the text returns every item, unit and number span.
+#
+# Boundaries:
+#   - every key must start a word ("tin" never matches "martin")
+#   - number words must also end on one ("das" is not "dashain")
+#   - items/units may carry a suffix ("chiniko", "kiloko")
+
+ITEM = "item"
+UNIT = "unit"
+NUMBER = "number"
+DIGIT = "digit"
+
+
+class EntityMatcher:
+    def __init__(self, item_map, unit_map, num_map):
+        self.lookup = {}
+        for kind, mapping in ((ITEM, item_map), (UNIT, unit_map), (NUMBER, num_map)):
+            for key, value in mapping.items():
+                self.lookup.setdefault(key.lower(), []).append((kind, value))
+
+        alternatives = []
+        for key in sorted(self.lookup, key=len, reverse=True):
+            is_number = any(kind == NUMBER for kind, _ in self.lookup[key])
+            alternatives.append(re.escape(key) + (r"\b" if is_number else ""))
+
+        words = "|".join(alternatives) or r"(?!x)x"
+        # (?<![^\W\d_]) = "not preceded by a letter", so "5kg" still finds "kg"
+        self.pattern = re.compile(rf"(?<![^\W\d_])(?P<word>{words})|(?P<digit>\d+(?:\.\d+)?)")
+
+    def find(self, text):
+        """Return [(start, end, kind, value), ...] in text order."""
+        spans = []
+        for m in self.pattern.finditer(text.lower()):
+            if m.group("digit") is not None:
+                spans.append((m.start(), m.end(), DIGIT, float(m.group("digit"))))
+                continue
+            for kind, value in self.lookup[m.group("word")]:
+                spans.append((m.start(), m.end(), kind, value))
+        return spans
+
+
+# -----------------------------
+# Cached instance, rebuilt when the mappings change
+# -----------------------------
+_matcher = None
+_signature = None
+
+
+def _mapping_signature():
+    maps = (nepali_mapping.ITEM_MAP, nepali_mapping.UNIT_MAP, nepali_mapping.NEPALI_NUM_MAP)
+    # A reload swaps the dict objects; in-place edits change the sizes
+    return tuple((id(m), len(m)) for m in maps)
+
+
+def get_matcher():
+    global _matcher, _signature
+    signature = _mapping_signature()
+    if _matcher is None or signature != _signature:
+        _matcher = EntityMatcher(nepali_mapping.ITEM_MAP, nepali_mapping.UNIT_MAP, nepali_mapping.NEPALI_NUM_MAP)
+        _signature = signature
+    return _matcher
+
+
+def rebuild():
+    """Force a rebuild (e.g. after editing a value in place)."""
+    global _matcher
+    _matcher = None
+    return get_matcher()
+
+
+def reload_mappings():
+    """Re-read nepali_mapping.py; the matcher picks up the new dicts on next use."""
+    importlib.reload(nepali_mapping)
+    return get_matcher()
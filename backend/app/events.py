@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import select
+import asyncio
+import threading
+from sqlalchemy import event, func
+from sqlalchemy import select as sql_select
+from sqlalchemy.orm import Session
+
+# ==========================================
+# 📡 STOCK CHANGE FEED
+# ==========================================
+# Every committed stock change is pushed to the connected dashboards
+# (GET /events/stock as Server-Sent Events, or the /events/stock/ws
+# WebSocket) instead of each client re-polling /products and /sales/stats:
+#
+#   {"product_id": 3, "quantity": 42.0, "delta": -2.0, "version": 118}
+#
+# `version` is the catalogue version of the change (app/catalog.py): a
+# client that reconnects, or receives {"type": "resync"} because it fell
+# behind, catches up with /products?since=<last version seen>.
+#
+# adjust_stock() stages the event on the session and it is published only
+# after COMMIT, so rolled-back sales never reach the screen.
+#
+#   STOCK_EVENTS_BACKEND=local     (default) one process, in-memory fan-out
+#   STOCK_EVENTS_BACKEND=postgres  NOTIFY inside the writing transaction
+#                                  (Postgres delivers it on commit), and
+#                                  every worker LISTENs, so all uvicorn
+#                                  workers share one feed
+
+CHANNEL = "stock_events"
+BACKEND = os.getenv("STOCK_EVENTS_BACKEND", "local").strip().lower()
+QUEUE_SIZE = int(os.getenv("STOCK_EVENTS_QUEUE", "256"))   # per subscriber
+KEEPALIVE_S = float(os.getenv("STOCK_EVENTS_KEEPALIVE_S", "15"))
+
+PENDING_KEY = "pending_stock_events"
+
+
+class Subscription:
+    def __init__(self, bus, loop, max_pending):
+        self.bus = bus
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def _put(self, item):
+        # Runs on the subscriber's loop
+        if self.queue.full():
+            # Too slow to keep up: drop the backlog, tell it to re-sync
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            item = {"type": "resync"}
+        self.queue.put_nowait(item)
+
+    async def get(self, timeout=None):
+        """Next event, or None after `timeout` seconds of silence."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StockEventBus:
+    """In-process fan-out. publish() may be called from any thread."""
+
+    def __init__(self, max_pending=QUEUE_SIZE):
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self):
+        sub = Subscription(self, asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, item):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, item)
+            except RuntimeError:
+                self.unsubscribe(sub)  # its loop is gone
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": BACKEND,
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "dropped": sum(sub.dropped for sub in self._subscribers),
+            }
+
+
+stock_events = StockEventBus()
+
+
+# ---------- STAGING (same transaction as the stock change) ----------
+def stage(db: Session, product_id, quantity, delta, version=None):
+    item = {"product_id": product_id, "quantity": quantity, "delta": delta, "version": version}
+    if BACKEND == "postgres":
+        # Transactional: Postgres only delivers it if this transaction commits
+        db.execute(sql_select(func.pg_notify(CHANNEL, json.dumps(item))))
+    else:
+        db.info.setdefault(PENDING_KEY, []).append(item)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    for item in session.info.pop(PENDING_KEY, ()):
+        stock_events.publish(item)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session, transaction):
+    # Rolled back (or closed without commit): nothing happened
+    if transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+# ---------- POSTGRES LISTEN/NOTIFY ----------
+def start_listener(engine, backend=BACKEND):
+    """Relay NOTIFYs from every worker into this process's bus (postgres backend only)."""
+    if backend != "postgres":
+        return None
+    if engine.dialect.name != "postgresql":
+        print("⚠️ STOCK_EVENTS_BACKEND=postgres needs a Postgres DATABASE_URL; stock feed stays local")
+        return None
+
+    def loop():
+        while True:
+            conn = None
+            try:
+                conn = engine.raw_connection()
+                dbapi = conn.driver_connection
+                dbapi.autocommit = True
+                dbapi.cursor().execute(f"LISTEN {CHANNEL}")
+                print(f"📡 Listening for stock events on '{CHANNEL}'")
+                while True:
+                    if select.select([dbapi], [], [], KEEPALIVE_S) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        note = dbapi.notifies.pop(0)
+                        stock_events.publish(json.loads(note.payload))
+            except Exception as e:
+                print(f"⚠️ Stock event listener lost its connection: {e}")
+                # Changes may have been missed while disconnected
+                stock_events.publish({"type": "resync"})
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.invalidate()
+                    except Exception:
+                        pass
+
+    thread = threading.Thread(target=loop, daemon=True, name="stock-events")
+    thread.start()
+    return thread
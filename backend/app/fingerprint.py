@@ -0,0 +1,150 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# ==========================================
+# 🔁 AUDIO FINGERPRINT CACHE (retried uploads)
+# ==========================================
+# On a flaky connection the app re-sends the same /voice upload two or
+# three times. Two different recordings never decode to identical PCM, so
+# an identical digest means "same clip again":
+#
+#   - the transcript is returned from here instead of running Whisper
+#   - if the first upload changed stock (an ADD or SALE that went through),
+#     its response is replayed instead of changing stock a second time (a
+#     retry that arrives while the first is still running waits for it)
+#
+# Nothing else is replayed: CHECK and UNKNOWN results, and refusals such as
+# "स्टक पुग्दैन", re-run so they reflect the stock as it is now.
+# Entries hold only text and the small response dict, are capped in count
+# and in text length, and expire after FINGERPRINT_TTL seconds.
+#
+# This cache is per process. The replay guard also holds across workers:
+# /voice reserves fingerprint_key(digest) in the idempotency table and
+# stores an applied response there in the same COMMIT as the stock change
+# (see app/idempotency.py). A retry that lands on another worker is
+# answered from that row, or gets 409 while the first run is still going.
+
+FINGERPRINT_CACHE_SIZE = int(os.getenv("FINGERPRINT_CACHE_SIZE", "512"))
+FINGERPRINT_TTL = float(os.getenv("FINGERPRINT_TTL", "600"))
+MAX_TEXT_CHARS = 1000
+
+
+def fingerprint_key(digest):
+    """Idempotency-table key for the replay guard of one clip."""
+    return f"pcm:{digest}"
+
+
+def pcm_digest(samples):
+    """128-bit BLAKE2b digest of the decoded float32 PCM."""
+    data = np.ascontiguousarray(samples, dtype=np.float32)
+    return hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("stored_at", "transcripts", "response")
+
+    def __init__(self):
+        self.stored_at = time.monotonic()
+        self.transcripts = {}   # model size -> {"text", "language"}
+        self.response = None    # replayable ADD/SALE response
+
+
+class AudioFingerprintCache:
+    def __init__(self, max_entries=FINGERPRINT_CACHE_SIZE, ttl=FINGERPRINT_TTL):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}     # digest -> future, owned by the request executing the command
+        self._lock = threading.Lock()
+        self.transcript_hits = 0
+        self.transcript_misses = 0
+        self.replays = 0
+
+    def _live(self, digest):
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.stored_at >= self.ttl:
+            del self._entries[digest]
+            return None
+        self._entries.move_to_end(digest)
+        return entry
+
+    def _entry_for_write(self, digest):
+        entry = self._live(digest)
+        if entry is None:
+            entry = self._entries[digest] = _Entry()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    # ---------- TRANSCRIPTS (called from the ASR worker) ----------
+    def get_transcript(self, digest, size):
+        with self._lock:
+            entry = self._live(digest)
+            transcript = entry.transcripts.get(size) if entry else None
+            if transcript is None:
+                self.transcript_misses += 1
+                return None
+            self.transcript_hits += 1
+            return dict(transcript, fingerprint=digest, cached=True)
+
+    def put_transcript(self, digest, size, result):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entry_for_write(digest).transcripts[size] = {
+                "text": result.get("text", "")[:MAX_TEXT_CHARS],
+                "language": result.get("language"),
+            }
+
+    # ---------- RESPONSES (called on the event loop) ----------
+    async def claim(self, digest):
+        """
+        Returns the stored response if this clip already ran an ADD/SALE.
+        Otherwise returns None and the caller owns execution until release().
+        """
+        while True:
+            with self._lock:
+                entry = self._live(digest)
+                if entry is not None and entry.response is not None:
+                    self.replays += 1
+                    return dict(entry.response, replayed=True)
+                pending = self._inflight.get(digest)
+                if pending is None:
+                    self._inflight[digest] = asyncio.get_running_loop().create_future()
+                    return None
+            # Same clip is being executed by another request: wait, then look again
+            await asyncio.shield(pending)
+
+    def release(self, digest, response=None, applied=False):
+        """End the claim; `applied` = the command changed stock, so retries get `response`."""
+        if response is not None and applied and self.max_entries:
+            with self._lock:
+                self._entry_for_write(digest).response = dict(response)
+        with self._lock:
+            pending = self._inflight.pop(digest, None)
+        if pending is not None and not pending.done():
+            pending.set_result(None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.transcript_hits + self.transcript_misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "transcript_hits": self.transcript_hits,
+                "transcript_misses": self.transcript_misses,
+                "hit_rate": round(self.transcript_hits / lookups, 4) if lookups else 0.0,
+                "replayed_commands": self.replays,
+                "in_flight": len(self._inflight),
+            }
+
+
+audio_fingerprints = AudioFingerprintCache()
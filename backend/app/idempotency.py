@@ -0,0 +1,131 @@
+import os
+import json
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+# ==========================================
+# 🔑 IDEMPOTENCY KEYS (/voice, /command)
+# ==========================================
+# The app sends one Idempotency-Key per user action and re-uses it on every
+# retry of that action. The first request reserves the key (a "pending"
+# row), does the work, and stores its response. Any retry is answered from
+# the stored row with a primary-key lookup, before the upload is read, so
+# no ASR, BERT or stock change runs twice.
+#
+#   same key, first run still going  -> 409 (client retries later)
+#   same key, other endpoint         -> 422
+#   pending row older than PENDING_TIMEOUT_S (worker died) -> taken over
+#
+# The stored response is written by record() inside the same DB transaction
+# as the stock change it reports. A crash before that COMMIT loses both, so
+# the key stays "pending" and a retry redoes the work once the pending
+# timeout has passed. After the COMMIT, a retry replays the response. A
+# sale is never applied without its response, or the other way round.
+#
+# Rows expire after IDEMPOTENCY_TTL_HOURS and are purged in the background
+# of normal traffic.
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+PENDING_TIMEOUT_S = float(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_S", "120"))
+PURGE_INTERVAL_S = 600
+MAX_KEY_LENGTH = 128
+REPLAY_HEADERS = {"Idempotent-Replayed": "true"}
+
+
+class IdempotencyError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+_last_purge = {"at": 0.0}
+
+
+def _purge_expired(db: Session):
+    now = time.monotonic()
+    if now - _last_purge["at"] < PURGE_INTERVAL_S:
+        return
+    _last_purge["at"] = now
+    db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.expires_at < datetime.utcnow()))
+    db.commit()
+
+
+def begin(db: Session, key: str, endpoint: str, ttl_seconds: float = None):
+    """
+    Reserve `key` for this request. Returns the stored response if the key
+    was already completed (replay it), or None if the caller should do the work.
+    The row lives IDEMPOTENCY_TTL_HOURS unless `ttl_seconds` is given.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+    _purge_expired(db)
+
+    now = datetime.utcnow()
+    expires_at = now + (timedelta(seconds=ttl_seconds) if ttl_seconds else timedelta(hours=IDEMPOTENCY_TTL_HOURS))
+    row = db.get(models.IdempotencyKey, key)
+
+    if row is not None and row.expires_at <= now:
+        db.delete(row)
+        db.commit()
+        row = None
+
+    if row is not None:
+        if row.endpoint != endpoint:
+            raise IdempotencyError(422, f"Idempotency-Key was already used for /{row.endpoint}")
+        if row.status == "done":
+            return json.loads(row.response)
+        if now - row.created_at < timedelta(seconds=PENDING_TIMEOUT_S):
+            raise IdempotencyError(409, "A request with this Idempotency-Key is still being processed")
+
+        # The first attempt never finished: take the reservation over (only one retry wins)
+        taken = db.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key == key, models.IdempotencyKey.created_at == row.created_at)
+            .values(created_at=now, expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if taken != 1:
+            raise IdempotencyError(409, "A request with this Idempotency-Key is still being processed")
+        return None
+
+    db.add(models.IdempotencyKey(key=key, endpoint=endpoint, status="pending", created_at=now, expires_at=expires_at))
+    try:
+        db.commit()
+    except IntegrityError:
+        # A parallel retry reserved it first
+        db.rollback()
+        raise IdempotencyError(409, "A request with this Idempotency-Key is still being processed")
+    return None
+
+
+def record(db: Session, key: str, response):
+    """Stage the response in the caller's transaction: it commits (or rolls back) with the work."""
+    db.execute(
+        update(models.IdempotencyKey)
+        .where(models.IdempotencyKey.key == key, models.IdempotencyKey.status == "pending")
+        .values(status="done", response=json.dumps(response, ensure_ascii=False, default=str))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def complete(db: Session, key: str, response):
+    """Store a response that changed nothing (no-op if the work already recorded one)."""
+    record(db, key, response)
+    db.commit()
+
+
+def abandon(db: Session, key: str):
+    """The request failed without a result worth replaying: free the key for a retry."""
+    db.rollback()
+    db.execute(
+        delete(models.IdempotencyKey)
+        .where(models.IdempotencyKey.key == key, models.IdempotencyKey.status == "pending")
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
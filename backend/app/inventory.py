@@ -1,36 +1,22 @@
-import os
-import shutil
-import uuid
-import torch
-import whisper
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from fastapi import APIRouter, Depends, UploadFile, File, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.database import get_db
 from app.brain import process_command
+from app.asr import registry, transcribe
 from app import models, schemas # Needed for the product list
+from app.catalog import next_version_sql, advance
 
 # Initialize Router
 router = APIRouter()
 
 # ==========================================
-# 🎤 SETUP WHISPER AI (Voice to Text)
+# 🎤 WHISPER AI (Voice to Text)
 # ==========================================
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"🚀 Loading Whisper model on {device}...")
-
-try:
-    # 'base' is a good balance. Use 'small' if you have a strong GPU.
-    model = whisper.load_model("base", device=device)
-    print("✅ Whisper AI Loaded Successfully!")
-except Exception as e:
-    print(f"⚠️ Whisper Load Failed: {e}")
-    model = None
-
-# Temp folder for audio uploads
-UPLOAD_DIR = "temp_audio"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Models come from the shared registry in app.asr (loaded once per process).
+# Uploads are decoded in memory by app.audio, so nothing is written to disk.
 
 # ==========================================
 # 🧠 SHARED LOGIC (The Executioner)
@@ -68,12 +54,20 @@ def execute_inventory_logic(user_text: str, db: Session):
             existing = db.execute(check_sql, {"name": item_key}).fetchone()
             
             if existing:
-                update_sql = text("UPDATE inventory SET quantity = quantity + :qty WHERE name = :name")
-                db.execute(update_sql, {"qty": qty, "name": item_key})
+                update_sql = text(
+                    "UPDATE inventory SET quantity = quantity + :qty, "
+                    f"version = {next_version_sql()}, updated_at = :now WHERE name = :name"
+                )
+                db.execute(update_sql, {"qty": qty, "name": item_key, "now": datetime.utcnow()})
+                advance(db)
                 msg = f"हस, {qty} {unit} {item_key} थपियो।"
             else:
-                insert_sql = text("INSERT INTO inventory (name, quantity, unit) VALUES (:name, :qty, :unit)")
-                db.execute(insert_sql, {"name": item_key, "qty": qty, "unit": unit})
+                insert_sql = text(
+                    "INSERT INTO inventory (name, quantity, unit, version, updated_at) "
+                    f"VALUES (:name, :qty, :unit, {next_version_sql()}, :now)"
+                )
+                db.execute(insert_sql, {"name": item_key, "qty": qty, "unit": unit, "now": datetime.utcnow()})
+                advance(db)
                 msg = f"नयाँ सामान: {item_key}, {qty} {unit} राखियो।"
             
             db.commit()
@@ -86,21 +80,26 @@ def execute_inventory_logic(user_text: str, db: Session):
 
         # 🔴 CASE 2: SALE STOCK
         elif intent == "SALE":
-            check_sql = text("SELECT quantity FROM inventory WHERE name = :name")
-            result = db.execute(check_sql, {"name": item_key}).fetchone()
+            # Check-and-deduct in ONE statement so parallel sales can't oversell
+            # (also stamps the catalogue version, only when the sale goes through)
+            update_sql = text(
+                f"UPDATE inventory SET quantity = quantity - :qty, version = {next_version_sql()}, updated_at = :now "
+                "WHERE name = :name AND quantity >= :qty RETURNING quantity"
+            )
+            updated = db.execute(update_sql, {"qty": qty, "name": item_key, "now": datetime.utcnow()}).fetchone()
             
-            if not result:
-                return {"status": "error", "nepali_msg": f"{item_key} स्टकमा छैन।"}
-            
-            current_stock = result[0]
-            if current_stock < qty:
+            if not updated:
+                check_sql = text("SELECT quantity FROM inventory WHERE name = :name")
+                result = db.execute(check_sql, {"name": item_key}).fetchone()
+                db.rollback()
+                if not result:
+                    return {"status": "error", "nepali_msg": f"{item_key} स्टकमा छैन।"}
                 return {
                     "status": "warning",
-                    "nepali_msg": f"स्टक पुग्दैन। जम्मा {current_stock} {unit} बाँकी छ।"
+                    "nepali_msg": f"स्टक पुग्दैन। जम्मा {result[0]} {unit} बाँकी छ।"
                 }
             
-            update_sql = text("UPDATE inventory SET quantity = quantity - :qty WHERE name = :name")
-            db.execute(update_sql, {"qty": qty, "name": item_key})
+            advance(db)
             db.commit()
             return {
                 "status": "success",
@@ -154,21 +153,19 @@ async def process_text_command(request: Request, db: Session = Depends(get_db)):
 
 # 2. VOICE Endpoint (For Microphone Input)
 @router.post("/voice")
-async def process_voice_command(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if not model:
-        return {"status": "error", "nepali_msg": "AI मोडेल लोड भएन।"}
-
-    # A. Save Audio File Temporarily
-    filename = f"{uuid.uuid4()}.wav"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-    
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+async def process_voice_command(file: UploadFile = File(...), model_size: Optional[str] = None, db: Session = Depends(get_db)):
+    try:
+        model_size = registry.resolve_size(model_size)
+    except ValueError as e:
+        return {"status": "error", "message": str(e), "nepali_msg": "AI मोडेल लोड भएन।"}
 
     try:
+        # A. Read the upload into memory
+        audio_bytes = await file.read()
+
         # B. Transcribe (Audio -> Text)
-        print(f"🎧 Transcribing {filename}...")
-        result = model.transcribe(filepath, language="ne", fp16=False)
+        print(f"🎧 Transcribing {file.filename} ({len(audio_bytes)} bytes)...")
+        result = await transcribe(audio_bytes, model_size)
         transcribed_text = result["text"].strip()
         print(f"🗣️ User Said: {transcribed_text}")
         
@@ -182,11 +179,6 @@ async def process_voice_command(file: UploadFile = File(...), db: Session = Depe
     except Exception as e:
         print(f"❌ Transcription Error: {e}")
         return {"status": "error", "message": str(e), "nepali_msg": "आवाज बुझ्न सकिएन।"}
-    
-    finally:
-        # D. Cleanup (Delete temp file)
-        if os.path.exists(filepath):
-            os.remove(filepath)
 
 # 3. GET PRODUCTS (List items for Frontend)
 @router.get("/products", response_model=List[schemas.ProductResponse])
@@ -1,28 +1,50 @@
 import os
-import uuid
-import whisper
-import torch
-import difflib
-from typing import List
+import json
+import asyncio
+import threading
+from typing import List, Optional
 
-from fastapi import FastAPI, File, UploadFile, Depends
+from fastapi import FastAPI, File, UploadFile, Depends, Header, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
-from .database import engine, get_db
+from .database import engine, get_db, SessionLocal
 from . import models, schemas
+from . import threads
+from .asr import registry, transcribe, warmup_sizes_from_env, ASR_SERVICE_SOCKET
+from .audio import SAMPLE_RATE, pcm16_to_float32, resample
+from .streaming import UtteranceSegmenter
+from .product_index import product_index
+from .stock import adjust_stock, InsufficientStock
+from .workers import nlu_pool, PoolSaturated
+from .fingerprint import audio_fingerprints, fingerprint_key, FINGERPRINT_TTL
+from . import idempotency
+from .idempotency import IdempotencyError, REPLAY_HEADERS
+from . import rollups                         # keeps daily_sales in step with SALE inserts
+from . import catalog                         # product versions for /products sync
+from .events import start_listener as start_stock_event_listener
 
 # --- IMPORT ROUTERS ---
 from .auth import router as auth_router       # Login/Register
 from .routers import sales, reports           # Sales Stats & PDF Reports
+from .routers import system                   # Model load stats
+from .routers import events as event_routes   # Live stock change feed
 
 # --- IMPORT BRAIN & NORMALIZER ---
 try:
-    from .brain import process_command_with_ai, normalize_nepali
+    from .brain import process_command as process_command_with_ai
+    from .brain import process_commands as process_commands_with_ai
+    from .brain import normalize_nepali
 except ImportError:
     def process_command_with_ai(text): return {"intent": "UNKNOWN", "item": None}
     def normalize_nepali(text): return text
+    def process_commands_with_ai(texts): return [process_command_with_ai(t) for t in texts]
+
+# Product names are indexed with the same normaliser the brain uses
+product_index.configure(normalize=normalize_nepali)
 
 # Create DB Tables
 models.Base.metadata.create_all(bind=engine)
@@ -37,28 +59,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Catalog-Version", "X-Deleted-Products", "Idempotent-Replayed"],
 )
 
 # --- ACTIVATE ROUTERS ---
 app.include_router(auth_router)
 app.include_router(sales.router)
 app.include_router(reports.router)
+app.include_router(system.router)
+app.include_router(event_routes.router)
+
+# --- TORCH THREADS ---
+# Split the cores between Whisper and BERT before the first request (Whisper's
+# share goes unused when it runs in the ASR service). Not at import: under
+# gunicorn the master imports this module and must stay single-threaded, and
+# post_fork (gunicorn.conf.py) has already configured each worker.
+@app.on_event("startup")
+def configure_torch_threads():
+    if not threads.configured():
+        threads.configure(stages=("nlu",) if ASR_SERVICE_SOCKET else threads.STAGES)
 
 # --- WHISPER SETUP ---
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"🚀 Loading Whisper model on {device}...")
-try:
-    model = whisper.load_model("small", device=device)
-except Exception as e:
-    print(f"⚠️ Whisper load failed: {e}")
-    model = None
+# Models live in the shared registry and load on first use. Sizes listed in
+# WHISPER_WARMUP are loaded in the background so "/" answers immediately.
+# With ASR_SERVICE_SOCKET the models live in the ASR service instead.
+@app.on_event("startup")
+def warm_up_whisper():
+    sizes = warmup_sizes_from_env()
+    if sizes and not ASR_SERVICE_SOCKET:
+        threading.Thread(target=registry.warm_up, args=(sizes,), daemon=True).start()
 
-UPLOAD_DIR = "temp_storage"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+@app.on_event("startup")
+def start_sales_rollup():
+    # Every worker calls this; only one of them runs the jobs
+    rollups.start_rollup_jobs(engine, SessionLocal)
+
+@app.on_event("startup")
+def start_stock_events():
+    # STOCK_EVENTS_BACKEND=postgres: share one stock feed across workers
+    start_stock_event_listener(engine)
 
 class Command(BaseModel):
     text: str
 
+# Longer offline queues are sent in several batches (422 above this)
+COMMAND_BATCH_MAX = int(os.getenv("COMMAND_BATCH_MAX", "500"))
+
+class BatchCommand(BaseModel):
+    texts: List[str] = Field(..., max_length=COMMAND_BATCH_MAX)
+
 # --- HELPER: NUMBER CONVERSION ---
 def convert_to_nepali_num(number: float) -> str:
     if number is None: return "०"
@@ -67,94 +116,368 @@ def convert_to_nepali_num(number: float) -> str:
     return str(number).translate(eng_to_nep)
 
 # --- SMART PHONETIC SEARCH (ACCENT PROOF) ---
+# Aspiration / voicing / retroflex / vowel-length slips (ताल, थाल, छिनि, टैल,
+# नून...) are caught by the phonetic key in the index. These are the
+# cross-class confusions it deliberately does not fold.
+OVERRIDES = {
+    "दान": "दाल", "जमाल": "चामल", "सामल": "चामल",
+    "सिनी": "चिनी", "पेल": "तेल", "लुन": "नुन"
+}
+
+def resolve_product_id(db: Session, spoken_item: str):
+    if not spoken_item: return None
+    spoken_item = OVERRIDES.get(spoken_item, spoken_item)
+    # Indexed lookup: exact name -> phonetic key -> contained name -> RapidFuzz over a bigram shortlist
+    return product_index.match_id(spoken_item, db)
+
 def find_closest_product(db: Session, spoken_item: str):
     if not spoken_item: return None
-    overrides = {
-        "ताल": "दाल", "टाल": "दाल", "थाल": "दाल", "दान": "दाल",
-        "जमाल": "चामल", "सामल": "चामल", "छामल": "चामल",
-        "चिनि": "चिनी", "छिनि": "चिनी", "सिनी": "चिनी",
-        "टेल": "तेल", "टैल": "तेल", "पेल": "तेल",
-        "नुन": "नुन", "नून": "नुन", "लुन": "नुन"
-    }
-    if spoken_item in overrides: spoken_item = overrides[spoken_item]
-
-    all_products = db.query(models.Product).all()
-    spoken_norm = normalize_nepali(spoken_item)
-    best_match = None
-    highest_score = 0.0
-
-    for product in all_products:
-        db_norm = normalize_nepali(product.name_nepali)
-        if spoken_norm == db_norm: return product
-        if db_norm in spoken_norm: return product
-        score = difflib.SequenceMatcher(None, spoken_norm, db_norm).ratio()
-        if score > highest_score:
-            highest_score = score
-            best_match = product
-
-    return best_match if highest_score > 0.6 else None
+    return product_index.match(OVERRIDES.get(spoken_item, spoken_item), db)
 
 # --- CORE LOGIC ---
-def execute_inventory_logic(text: str, db: Session):
-    ai_data = process_command_with_ai(text)
+def apply_inventory_command(db: Session, ai_data: dict, product):
+    """
+    Turn one analysed command into a reply, staging stock changes and the
+    Transaction row on the session. Returns (reply, changed); the caller commits.
+    """
     intent = ai_data.get("intent")
     raw_item = ai_data.get("item")
     qty = float(ai_data.get("quantity", 1))
-    
-    product = find_closest_product(db, raw_item)
+
     item_display = product.name_nepali if product else raw_item
     qty_display = convert_to_nepali_num(qty)
 
     if not product:
-        if intent == "CHECK": return {"intent": intent, "response": "❌ यो सामान स्टकमा भेटिएन।"}
-        return {"intent": intent, "response": f"❌ '{raw_item}' बुझिन।"}
+        if intent == "CHECK": return {"intent": intent, "response": "❌ यो सामान स्टकमा भेटिएन।"}, False
+        return {"intent": intent, "response": f"❌ '{raw_item}' बुझिन।"}, False
 
+    # Stock moves through one conditional UPDATE ... RETURNING (see app/stock.py),
+    # so concurrent counters can't oversell or overwrite each other.
     if intent == "ADD":
-        product.quantity += qty
+        adjust_stock(db, product, qty)
         total_cost = qty * product.cost_price
-        db.add(models.Transaction(product_id=product.id, change_amount=qty, transaction_type="PURCHASE", total_value=total_cost))
-        db.commit()
-        return {"intent": intent, "response": f"✅ {item_display} {qty_display} {product.unit} थपियो।"}
+        db.add(models.Transaction(product_id=product.id, quantity=qty, transaction_type="PURCHASE", total_amount=total_cost))
+        return {"intent": intent, "response": f"✅ {item_display} {qty_display} {product.unit} थपियो।"}, True
 
     if intent == "SALE":
-        if product.quantity < qty:
-            rem_qty = convert_to_nepali_num(product.quantity)
-            return {"intent": intent, "response": f"❌ {item_display} को स्टक पुग्दैन। (बाँकी: {rem_qty} {product.unit})"}
-        product.quantity -= qty
+        try:
+            adjust_stock(db, product, -qty)
+        except InsufficientStock as e:
+            rem_qty = convert_to_nepali_num(e.available)
+            return {"intent": intent, "response": f"❌ {item_display} को स्टक पुग्दैन। (बाँकी: {rem_qty} {product.unit})"}, False
         total_rev = qty * product.selling_price
-        db.add(models.Transaction(product_id=product.id, change_amount=-qty, transaction_type="SALE", total_value=total_rev))
-        db.commit()
-        return {"intent": intent, "response": f"✅ {item_display} बिक्री भयो।"}
+        db.add(models.Transaction(product_id=product.id, quantity=qty, transaction_type="SALE", total_amount=total_rev))
+        return {"intent": intent, "response": f"✅ {item_display} बिक्री भयो।"}, True
 
     if intent == "CHECK":
-        return {"intent": intent, "response": f"📦 {item_display}: {convert_to_nepali_num(product.quantity)} {product.unit}।"}
+        return {"intent": intent, "response": f"📦 {item_display}: {convert_to_nepali_num(product.quantity)} {product.unit}।"}, False
 
-    return {"intent": "UNKNOWN", "response": "❌ आदेश बुझिन।"}
+    return {"intent": "UNKNOWN", "response": "❌ आदेश बुझिन।"}, False
+
+def execute_inventory_logic(text: str, db: Session, idempotency_key: Optional[str] = None, transcription: Optional[str] = None):
+    return run_inventory_command(text, db, idempotency_key, transcription)[0]
+
+def run_inventory_command(
+    text: str,
+    db: Session,
+    idempotency_key: Optional[str] = None,
+    transcription: Optional[str] = None,
+    replay_key: Optional[str] = None,
+):
+    """execute_inventory_logic, also returning whether stock changed: (reply, changed)."""
+    ai_data = process_command_with_ai(text)
+    product = find_closest_product(db, ai_data.get("item"))
+    reply, changed = apply_inventory_command(db, ai_data, product)
+    if transcription is not None:
+        reply["transcription"] = transcription
+    if idempotency_key:
+        # Same COMMIT as the stock change: a retry can't apply it twice
+        idempotency.record(db, idempotency_key, reply)
+    if replay_key and changed:
+        # Re-uploads of the same clip, on any worker, get this reply back
+        idempotency.record(db, replay_key, reply)
+    if changed or idempotency_key: db.commit()
+    return reply, changed
+
+def execute_inventory_command(text: str):
+    # For callers without a request-scoped session (the voice WebSocket)
+    db = SessionLocal()
+    try:
+        return execute_inventory_logic(text, db)
+    finally:
+        db.close()
+
+def execute_inventory_batch(texts: List[str], db: Session, idempotency_key: Optional[str] = None):
+    """
+    Replay many commands at once: one batched BERT pass, one product query,
+    one transaction. Items are applied in order, so a SALE sees the stock left
+    by the commands before it.
+    """
+    analysed = process_commands_with_ai(texts)
+    product_ids = [resolve_product_id(db, a.get("item")) for a in analysed]
+
+    wanted = {pid for pid in product_ids if pid is not None}
+    products = {}
+    if wanted:
+        products = {p.id: p for p in db.query(models.Product).filter(models.Product.id.in_(wanted)).all()}
+
+    results = []
+    any_changed = False
+    for i, (text, ai_data, pid) in enumerate(zip(texts, analysed, product_ids)):
+        reply, changed = apply_inventory_command(db, ai_data, products.get(pid))
+        any_changed = any_changed or changed
+        results.append({"index": i, "text": text, "applied": changed, **reply})
+
+    response = {"committed": any_changed, "results": results}
+    if idempotency_key:
+        idempotency.record(db, idempotency_key, response)
+    if any_changed or idempotency_key:
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            for r in results:
+                r["applied"] = False
+            return {"committed": False, "error": str(e), "results": results}
+
+    return response
 
 # --- ENDPOINTS ---
 @app.get("/")
 def read_root():
     return {"message": "SmartBiz AI System is Online 🚀"}
 
+# --- IDEMPOTENCY (retried uploads must not change stock twice) ---
+def run_idempotent(db: Session, key: Optional[str], endpoint: str, work):
+    # work(key) records its response in the transaction that changes stock
+    if not key:
+        return work(None)
+    try:
+        replay = idempotency.begin(db, key, endpoint)
+    except IdempotencyError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+    if replay is not None:
+        return JSONResponse(content=replay, headers=REPLAY_HEADERS)
+    try:
+        response = work(key)
+    except Exception:
+        idempotency.abandon(db, key)
+        raise
+    if isinstance(response, dict) and "error" in response:
+        # Rolled back together with the work: let the retry do it
+        idempotency.abandon(db, key)
+    else:
+        idempotency.complete(db, key, response)
+    return response
+
 @app.post("/command")
-def process_command(cmd: Command, db: Session = Depends(get_db)):
-    return execute_inventory_logic(cmd.text, db)
+def process_command(cmd: Command, db: Session = Depends(get_db), idempotency_key: Optional[str] = Header(None)):
+    return run_idempotent(db, idempotency_key, "command", lambda key: execute_inventory_logic(cmd.text, db, key))
+
+@app.post("/command/batch")
+def process_command_batch(batch: BatchCommand, db: Session = Depends(get_db), idempotency_key: Optional[str] = Header(None)):
+    # For the POS sync job: hundreds of queued offline commands in one request
+    return run_idempotent(db, idempotency_key, "command/batch", lambda key: execute_inventory_batch(batch.texts, db, key))
 
 @app.post("/voice")
-async def process_voice_command(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def process_voice_command(
+    file: UploadFile = File(...),
+    model_size: Optional[str] = None,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    if not idempotency_key:
+        return await run_voice_command(file, model_size, db)
+
+    # Replays are answered before the upload is even read
     try:
-        if not model: return {"error": "AI Model not loaded"}
-        filename = f"{uuid.uuid4()}.wav"
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        with open(filepath, "wb") as f: f.write(await file.read())
-        result = model.transcribe(filepath, language="ne", fp16=False)
-        if os.path.exists(filepath): os.remove(filepath)
-        result_data = execute_inventory_logic(result["text"].strip(), db)
-        result_data["transcription"] = result["text"].strip()
+        replay = await run_in_threadpool(idempotency.begin, db, idempotency_key, "voice")
+    except IdempotencyError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+    if replay is not None:
+        return JSONResponse(content=replay, headers=REPLAY_HEADERS)
+
+    response = await run_voice_command(file, model_size, db, idempotency_key)
+    if isinstance(response, dict) and "error" not in response:
+        await run_in_threadpool(idempotency.complete, db, idempotency_key, response)
+    else:
+        # 429 / failures are not final answers: let the retry do the work
+        await run_in_threadpool(idempotency.abandon, db, idempotency_key)
+    return response
+
+async def run_voice_command(file: UploadFile, model_size: Optional[str], db: Session, idempotency_key: Optional[str] = None):
+    try:
+        try:
+            model_size = registry.resolve_size(model_size)
+        except ValueError as e:
+            return {"error": str(e)}
+        # Decoded in memory from the request bytes (no temp file, no ffmpeg).
+        # Whisper and BERT run on their own bounded pools, never on the event loop.
+        result = await transcribe(await file.read(), model_size)
+        if not result["text"].strip():
+            # Silent clip (dropped by VAD) or nothing recognised: skip the NLU + DB work
+            return {"intent": "UNKNOWN", "response": "❌ आवाज सुनिएन।", "transcription": ""}
+
+        # A retried upload of a clip that already did an ADD/SALE gets the
+        # first response back instead of changing stock again
+        fingerprint = result.get("fingerprint")
+        replay_key = None
+        if fingerprint:
+            replay = await audio_fingerprints.claim(fingerprint)
+            if replay is not None:
+                return replay
+            # The retry may have reached another worker: same guard in the DB
+            replay_key = fingerprint_key(fingerprint)
+            try:
+                stored = await run_in_threadpool(idempotency.begin, db, replay_key, "voice-pcm", FINGERPRINT_TTL)
+            except IdempotencyError as e:
+                audio_fingerprints.release(fingerprint)
+                message = "This recording is still being processed" if e.status_code == 409 else str(e)
+                return JSONResponse(status_code=e.status_code, content={"error": message})
+            if stored is not None:
+                audio_fingerprints.release(fingerprint, stored, applied=True)
+                return dict(stored, replayed=True)
+
+        result_data, changed = None, False
+        try:
+            text = result["text"].strip()
+            result_data, changed = await nlu_pool.run(run_inventory_command, text, db, idempotency_key, text, replay_key)
+        finally:
+            if fingerprint:
+                # Only a command that changed stock is replayed; a refused sale re-runs
+                audio_fingerprints.release(fingerprint, result_data, applied=changed)
+            if replay_key and not changed:
+                await run_in_threadpool(idempotency.abandon, db, replay_key)
         return result_data
+    except PoolSaturated as e:
+        return JSONResponse(
+            status_code=429,
+            content={"error": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         return {"error": str(e)}
 
+@app.websocket("/ws/voice")
+async def stream_voice_command(websocket: WebSocket, model_size: Optional[str] = None, sample_rate: int = SAMPLE_RATE):
+    """
+    Live voice commands. The client streams raw 16-bit little-endian mono PCM
+    as binary messages (and may send {"type": "end"} when the mic button is
+    released). The server pushes JSON:
+      {"type": "speech_start"}
+      {"type": "partial", "text": ...}              while the user is talking
+      {"type": "final", "transcription": ..., ...}   command result at end of speech
+      {"type": "error", "error": ...}
+    The socket stays open for the next command.
+    """
+    await websocket.accept()
+    try:
+        model_size = registry.resolve_size(model_size)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close()
+        return
+
+    segmenter = UtteranceSegmenter()
+    send_lock = asyncio.Lock()
+    partial_task = None
+    odd_byte = b""  # a frame may split a 16-bit sample: its first byte waits for the next frame
+
+    async def send(message):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    async def send_partial(audio):
+        # Partials are best-effort: whatever goes wrong here, the final decode still runs
+        try:
+            result = await transcribe(audio, model_size)
+            text = result["text"].strip()
+            if text:
+                await send({"type": "partial", "text": text})
+        except PoolSaturated:
+            pass
+        except Exception as e:
+            print(f"⚠️ Partial decode failed: {e}")
+
+    async def send_final(audio):
+        try:
+            result = await transcribe(audio, model_size)
+            text = result["text"].strip()
+            if not text:
+                await send({"type": "final", "transcription": "", "response": "❌ आवाज सुनिएन।"})
+                return
+            result_data = await nlu_pool.run(execute_inventory_command, text)
+            result_data.update({"type": "final", "transcription": text})
+            await send(result_data)
+        except PoolSaturated as e:
+            await send({"type": "error", "error": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            await send({"type": "error", "error": str(e)})
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            events = []
+            if message.get("bytes"):
+                data = odd_byte + message["bytes"]
+                whole = len(data) - len(data) % 2
+                odd_byte = data[whole:]
+                if whole:
+                    chunk = pcm16_to_float32(data[:whole])
+                    if sample_rate != SAMPLE_RATE:
+                        chunk = resample(chunk, sample_rate, SAMPLE_RATE)
+                    events = segmenter.feed(chunk)
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if control.get("type") == "end":
+                    odd_byte = b""
+                    audio = segmenter.flush()
+                    if audio is not None:
+                        events = [("end", audio)]
+
+            for kind, audio in events:
+                if kind == "start":
+                    await send({"type": "speech_start"})
+                else:
+                    # The final decode supersedes any partial still running
+                    if partial_task and not partial_task.done():
+                        partial_task.cancel()
+                    await send_final(audio)
+
+            # Rolling partial: re-decode the utterance so far, one at a time
+            if segmenter.partial_due() and (partial_task is None or partial_task.done()):
+                partial_task = asyncio.create_task(send_partial(segmenter.utterance()))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if partial_task and not partial_task.done():
+            partial_task.cancel()
+
 @app.get("/products", response_model=List[schemas.ProductResponse])
-def get_products(db: Session = Depends(get_db)):
-    return db.query(models.Product).all()
\ No newline at end of file
+def get_products(
+    response: Response,
+    since: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    # Tablets poll this. Unchanged catalogue -> 304 without reading products;
+    # ?since=<X-Catalog-Version from the last call> -> only the rows changed after it,
+    # plus the ids deleted after it in X-Deleted-Products (comma-separated).
+    version = catalog.current_version(db)
+    etag = catalog.etag(version, since)
+    headers = {"ETag": etag, "X-Catalog-Version": str(version)}
+    if catalog.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    query = db.query(models.Product)
+    if since is not None:
+        query = query.filter(models.Product.version > catalog.since_floor(since))
+        headers["X-Deleted-Products"] = ",".join(str(i) for i in catalog.deleted_since(db, since))
+    response.headers.update(headers)
+    return query.order_by(models.Product.id).all()
\ No newline at end of file
@@ -0,0 +1,226 @@
+from datetime import datetime, date
+from sqlalchemy import text, inspect
+
+# ==========================================
+# 🧱 SCHEMA MIGRATIONS
+# ==========================================
+# create_all() only creates missing tables; it never touches a table that
+# already exists. Changes to existing tables live here, in order, and
+# scripts/migrate.py applies the ones not yet recorded in
+# `schema_migrations`. Every step is written to be safe to re-run.
+#
+# Optional steps (Postgres partitioning) only run when asked for.
+
+MIGRATIONS = []
+
+
+class Migration:
+    def __init__(self, id, description, fn, dialects=None, autocommit=False, optional=False):
+        self.id = id
+        self.description = description
+        self.fn = fn
+        self.dialects = dialects        # None = every database
+        self.autocommit = autocommit    # CREATE INDEX CONCURRENTLY can't run in a transaction
+        self.optional = optional
+
+
+def migration(id, description, **kwargs):
+    def register(fn):
+        MIGRATIONS.append(Migration(id, description, fn, **kwargs))
+        return fn
+    return register
+
+
+def _ensure_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " id VARCHAR(64) PRIMARY KEY,"
+            " applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_ids(engine):
+    _ensure_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+
+
+def pending(engine, include_optional=()):
+    done = applied_ids(engine)
+    dialect = engine.dialect.name
+    return [
+        m for m in MIGRATIONS
+        if m.id not in done
+        and (m.dialects is None or dialect in m.dialects)
+        and (not m.optional or m.id in include_optional)
+    ]
+
+
+def run(engine, include_optional=()):
+    """Apply pending migrations in order. Returns the ids applied."""
+    done = []
+    for m in pending(engine, include_optional):
+        print(f"🧱 {m.id}: {m.description}")
+        with engine.connect() as conn:
+            if m.autocommit:
+                m.fn(conn.execution_options(isolation_level="AUTOCOMMIT"))
+            else:
+                with conn.begin():
+                    m.fn(conn)
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :at)"),
+                {"id": m.id, "at": datetime.utcnow()},
+            )
+        done.append(m.id)
+    return done
+
+
+# ---------- 0001: transaction indexes ----------
+TRANSACTION_INDEXES = {
+    "ix_transactions_type_timestamp": '(transaction_type, "timestamp")',
+    "ix_transactions_product_timestamp": '(product_id, "timestamp")',
+    "ix_transactions_timestamp_id": '("timestamp", id)',
+}
+
+
+@migration("0001_transaction_indexes", "composite indexes on transactions", autocommit=True)
+def add_transaction_indexes(conn):
+    # CONCURRENTLY on Postgres so the till keeps writing while it builds
+    concurrently = "CONCURRENTLY " if conn.dialect.name == "postgresql" else ""
+    for name, columns in TRANSACTION_INDEXES.items():
+        conn.execute(text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON transactions {columns}"))
+
+
+# ---------- 0002 (optional, Postgres): monthly partitions ----------
+PARTITION_MONTHS_AHEAD = 3
+
+
+def _month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d):
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def ensure_partitions(conn, months_ahead=PARTITION_MONTHS_AHEAD, since=None):
+    """Create the monthly partitions up to `months_ahead` from now (run monthly, e.g. from cron)."""
+    month = _month_start(since or datetime.utcnow().date())
+    last = _month_start(datetime.utcnow().date())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    created = 0
+    while month <= last:
+        name = f"transactions_{month:%Y_%m}"
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF transactions "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+        ))
+        month = _next_month(month)
+        created += 1
+    return created
+
+
+@migration("0002_partition_transactions", "range-partition transactions by month",
+           dialects=("postgresql",), optional=True)
+def partition_transactions(conn):
+    already = conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'transactions'"
+    )).first()
+    if already:
+        return
+
+    first = conn.execute(text('SELECT min("timestamp") FROM transactions')).scalar()
+    seq = conn.execute(text("SELECT pg_get_serial_sequence('transactions', 'id')")).scalar()
+
+    pkey = conn.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = 'transactions'::regclass AND contype = 'p'"
+    )).scalar()
+
+    conn.execute(text("ALTER TABLE transactions RENAME TO transactions_unpartitioned"))
+    if seq:
+        # Keep the id sequence alive when the old table is dropped
+        conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY NONE"))
+    # Index and primary-key names are global: move the old ones out of the way
+    if pkey:
+        conn.execute(text(f"ALTER TABLE transactions_unpartitioned RENAME CONSTRAINT {pkey} TO {pkey}_old"))
+    for name in list(TRANSACTION_INDEXES) + ["ix_transactions_id"]:
+        conn.execute(text(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old"))
+    # The partition key can't be NULL (it becomes part of the primary key)
+    conn.execute(text(
+        'UPDATE transactions_unpartitioned SET "timestamp" = now() AT TIME ZONE \'utc\' WHERE "timestamp" IS NULL'
+    ))
+
+    conn.execute(text(
+        "CREATE TABLE transactions (LIKE transactions_unpartitioned INCLUDING DEFAULTS) "
+        'PARTITION BY RANGE ("timestamp")'
+    ))
+    # The partition key has to be part of the primary key
+    conn.execute(text('ALTER TABLE transactions ADD PRIMARY KEY (id, "timestamp")'))
+    conn.execute(text(
+        "ALTER TABLE transactions ADD FOREIGN KEY (product_id) REFERENCES inventory (id)"
+    ))
+    conn.execute(text("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT"))
+    ensure_partitions(conn, since=first.date() if first else None)
+
+    conn.execute(text("INSERT INTO transactions SELECT * FROM transactions_unpartitioned"))
+    for name, columns in TRANSACTION_INDEXES.items():
+        conn.execute(text(f"CREATE INDEX {name} ON transactions {columns}"))
+    conn.execute(text("CREATE INDEX ix_transactions_id ON transactions (id)"))
+    if seq:
+        conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY transactions.id"))
+    conn.execute(text("DROP TABLE transactions_unpartitioned"))
+    conn.execute(text("ANALYZE transactions"))
+
+
+# ---------- 0003: Nepali product names ----------
+@migration("0003_product_nepali_names", "name_nepali on inventory (voice lookups, seed.py)")
+def add_product_nepali_names(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("inventory")}
+    if "name_nepali" not in columns:
+        conn.execute(text("ALTER TABLE inventory ADD COLUMN name_nepali VARCHAR"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_inventory_name_nepali ON inventory (name_nepali)"))
+    # Older rows only have `name`: keep them findable by voice until renamed
+    conn.execute(text("UPDATE inventory SET name_nepali = name WHERE name_nepali IS NULL"))
+
+
+# ---------- 0004: product versions for /products?since= ----------
+@migration("0004_product_versions", "version / updated_at on inventory + catalog_version_seq")
+def add_product_versions(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("inventory")}
+    if "version" not in columns:
+        conn.execute(text("ALTER TABLE inventory ADD COLUMN version BIGINT DEFAULT 0"))
+    if "updated_at" not in columns:
+        conn.execute(text("ALTER TABLE inventory ADD COLUMN updated_at TIMESTAMP"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_inventory_version ON inventory (version)"))
+
+    # Existing rows: version 1 so a client syncing from 0 receives them
+    conn.execute(text("UPDATE inventory SET version = 1 WHERE version IS NULL OR version = 0"))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE SEQUENCE IF NOT EXISTS catalog_version_seq"))
+        latest = conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM inventory")).scalar()
+        conn.execute(text("SELECT setval('catalog_version_seq', :v)"), {"v": max(latest, 1)})
+
+
+# ---------- 0005: catalogue clock and tombstones ----------
+@migration("0005_catalog_deletions", "catalog_deletions tombstones + catalog_clock (SQLite)")
+def add_catalog_deletions(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS catalog_deletions ("
+        " product_id INTEGER PRIMARY KEY,"
+        " version BIGINT NOT NULL,"
+        " deleted_at TIMESTAMP)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_catalog_deletions_version ON catalog_deletions (version)"))
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS catalog_clock (id INTEGER PRIMARY KEY, version BIGINT NOT NULL DEFAULT 0)"
+    ))
+    if conn.dialect.name != "postgresql":
+        # Start above every version already handed out (Postgres has its sequence)
+        conn.execute(text(
+            "INSERT INTO catalog_clock (id, version) SELECT 1, (SELECT COALESCE(MAX(version), 0) FROM inventory) "
+            "WHERE NOT EXISTS (SELECT 1 FROM catalog_clock WHERE id = 1)"
+        ))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, ForeignKey, DateTime, Date, Text, Index, Sequence
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -29,14 +29,37 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)  # e.g., "chamal"
     name_english = Column(String, nullable=True)    # e.g., "Rice"
+    name_nepali = Column(String, nullable=True, index=True)  # e.g., "चामल" (what voice commands match)
     quantity = Column(Float, default=0.0)
     unit = Column(String, default="kg")             # kg, ltr, packet
     cost_price = Column(Float, default=0.0)
     selling_price = Column(Float, default=0.0)
+
+    # Catalogue version of the last change (app/catalog.py) for /products?since=
+    version = Column(BigInteger, default=0, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship to transactions
     transactions = relationship("Transaction", back_populates="product")
 
+# Source of Product.version on Postgres (app/catalog.py); SQLite skips it
+catalog_version_seq = Sequence("catalog_version_seq", metadata=Base.metadata)
+
+class CatalogClock(Base):
+    __tablename__ = "catalog_clock"
+
+    # SQLite's counterpart of catalog_version_seq: one row, the last version issued
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class CatalogDeletion(Base):
+    __tablename__ = "catalog_deletions"
+
+    # Tombstone per deleted product, so /products?since= can report deletions
+    product_id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
 class Transaction(Base):
     __tablename__ = "transactions"
 
@@ -49,6 +72,35 @@ class Transaction(Base):
 
     product = relationship("Product", back_populates="transactions")
 
+    # Existing databases get these from app/migrations.py (scripts/migrate.py)
+    __table_args__ = (
+        Index("ix_transactions_type_timestamp", "transaction_type", "timestamp"),    # sales by period
+        Index("ix_transactions_product_timestamp", "product_id", "timestamp"),       # one product's history
+        Index("ix_transactions_timestamp_id", "timestamp", "id"),                    # newest-first history
+    )
+
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+
+    # One row per day, kept up to date as SALE transactions are written
+    # (app/rollups.py) so /sales/stats never scans `transactions`.
+    day = Column(Date, primary_key=True)
+    revenue = Column(Float, default=0.0)
+    cost = Column(Float, default=0.0)        # cost price of the goods sold
+    sales_count = Column(Integer, default=0)
+    units_sold = Column(Float, default=0.0)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Client-chosen key from the Idempotency-Key header (one per user action)
+    key = Column(String(128), primary_key=True)
+    endpoint = Column(String(32))                   # "voice", "command", "command/batch", "voice-pcm"
+    status = Column(String(16), default="pending")  # pending -> done
+    response = Column(Text, nullable=True)          # first response, as JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)       # purged after this
+
 # ==========================================
 # 🔐 MISSING PASSWORD FUNCTIONS (Added Here)
 # ==========================================
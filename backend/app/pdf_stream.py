@@ -0,0 +1,114 @@
+import zlib
+
+# ==========================================
+# 📄 STREAMING PDF WRITER
+# ==========================================
+# ReportLab keeps every page in memory until the document is saved. For
+# reports with an unbounded number of rows this writer emits the PDF as it
+# goes instead: a header, then one (content, page) object pair per page,
+# and the page tree + xref table at the end. All it remembers between
+# pages is the byte offset of each object, so memory stays flat whatever
+# the page count and the client gets the first bytes immediately.
+#
+# Text uses the standard Helvetica fonts (WinAnsi), so no font embedding.
+
+CATALOG_ID = 1
+PAGES_ID = 2
+FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold"}
+
+
+def escape_text(text):
+    """PDF literal string body (WinAnsi; unsupported characters become '?')."""
+    raw = str(text).encode("cp1252", errors="replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class StreamingPDF:
+    def __init__(self, width, height, compress=True):
+        self.width = width
+        self.height = height
+        self.compress = compress
+        self.offset = 0
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = PAGES_ID + len(FONTS) + 1
+        self.font_ids = {name: PAGES_ID + 1 + i for i, name in enumerate(FONTS)}
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _object(self, obj_id, body):
+        self.offsets[obj_id] = self.offset
+        return self._emit(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    def begin(self):
+        chunks = [self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")]
+        for name, base_font in FONTS.items():
+            chunks.append(self._object(
+                self.font_ids[name],
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % base_font.encode(),
+            ))
+        return b"".join(chunks)
+
+    def page(self, content):
+        """Emit one finished page. `content` is the raw PDF drawing operators."""
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.page_ids.append(page_id)
+
+        if self.compress:
+            content = zlib.compress(content, 6)
+            stream_dict = b"<< /Length %d /Filter /FlateDecode >>" % len(content)
+        else:
+            stream_dict = b"<< /Length %d >>" % len(content)
+
+        fonts = b" ".join(b"/%s %d 0 R" % (name.encode(), obj_id) for name, obj_id in self.font_ids.items())
+        return (
+            self._object(content_id, stream_dict + b"\nstream\n" + content + b"\nendstream")
+            + self._object(page_id, (
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] "
+                b"/Resources << /Font << %s >> >> /Contents %d 0 R >>"
+            ) % (PAGES_ID, _num(self.width), _num(self.height), fonts, content_id))
+        )
+
+    def end(self):
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        chunks = [
+            self._object(PAGES_ID, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids))),
+            self._object(CATALOG_ID, b"<< /Type /Catalog /Pages %d 0 R >>" % PAGES_ID),
+        ]
+
+        xref_at = self.offset
+        size = self.next_id
+        xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            xref.append(b"%010d 00000 n \n" % self.offsets.get(obj_id, 0))
+        chunks.append(self._emit(b"".join(xref)))
+        chunks.append(self._emit(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, CATALOG_ID, xref_at)
+        ))
+        return b"".join(chunks)
+
+
+def _num(value):
+    return (b"%.2f" % value).rstrip(b"0").rstrip(b".")
+
+
+# ---------- DRAWING HELPERS (PDF operators) ----------
+def fill_rect(x, y, w, h, rgb):
+    return b"%s rg %s %s %s %s re f\n" % (_rgb(rgb), _num(x), _num(y), _num(w), _num(h))
+
+
+def stroke_rect(x, y, w, h, rgb=(0, 0, 0), width=1):
+    return b"%s RG %s w %s %s %s %s re S\n" % (_rgb(rgb), _num(width), _num(x), _num(y), _num(w), _num(h))
+
+
+def text(x, y, value, font="F1", size=10, rgb=(0, 0, 0)):
+    return b"BT %s rg /%s %s Tf %s %s Td (%s) Tj ET\n" % (
+        _rgb(rgb), font.encode(), _num(size), _num(x), _num(y), escape_text(value)
+    )
+
+
+def _rgb(rgb):
+    return b" ".join(_num(c) for c in rgb)
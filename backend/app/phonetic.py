@@ -0,0 +1,46 @@
+# ==========================================
+# 🔉 NEPALI PHONETIC KEY (Devanagari sound classes)
+# ==========================================
+# Whisper mishears Nepali consonants within the same place of articulation
+# (ताल/थाल/टाल/दाल, छिनि/चिनी, टैल/तेल). Folding each sound class to one
+# letter turns most of those mis-hearings into an exact dict lookup.
+#
+#   aspirated -> plain        ख→क  छ→च  थ→त  फ→प ...
+#   voiced    -> voiceless    ग→क  ज→च  द→त  ब→प ...
+#   retroflex -> dental       ट ठ ड ढ → त,  ण→न,  ष श→स
+#   flaps                     ड़ ढ़ → र   (चिउड़ा/चिउरा)
+#   vowel length              ी→ि  ू→ु  ई→इ  ऊ→उ  (and ै→े  ौ→ो)
+#   nasalisation              ं ँ ङ ञ → न
+#   dropped                   ् (halant)  ़ (nukta)  ः  spaces/punctuation
+
+_CLASSES = {
+    "क": "कखगघ",
+    "च": "चछजझ",
+    "त": "टठडढतथदध",
+    "र": "र\u095c\u095d",           # precomposed ड़ ढ़
+    "प": "पफबभव",
+    "न": "नणङञंँ",
+    "स": "सशष",
+    "ि": "िी",
+    "ु": "ुू",
+    "इ": "इई",
+    "उ": "उऊ",
+    "े": "ेै",
+    "ो": "ोौ",
+    "ए": "एऐ",
+    "ओ": "ओऔ",
+}
+
+_DROP = "\u093c\u094d\u0903\u0964\u0965?!.,-_'\" \u200b\u200c\u200d"
+
+_TABLE = {ord(src): key for key, members in _CLASSES.items() for src in members}
+_TABLE.update({ord(ch): None for ch in _DROP})
+
+
+def phonetic_key(text):
+    """Collapse a Devanagari word to its sound-class key, e.g. 'थाल' -> 'ताल', 'दाल' -> 'ताल'."""
+    if not text:
+        return ""
+    # Decomposed flaps (consonant + nukta) are folded before the nukta is dropped
+    text = text.strip().replace("\u0921\u093c", "र").replace("\u0922\u093c", "र")
+    return text.translate(_TABLE)
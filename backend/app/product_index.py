@@ -0,0 +1,213 @@
+import os
+import time
+import threading
+from sqlalchemy import event, select, inspect
+from sqlalchemy.orm import Session
+from rapidfuzz import fuzz, process
+
+from . import models
+from .phonetic import phonetic_key
+
+# ==========================================
+# 🗂️ IN-PROCESS PRODUCT NAME INDEX
+# ==========================================
+# Replaces the "read every product, difflib every name" scan. Normalised
+# names are keyed by their Nepali phonetic key (most ASR mis-hearings are a
+# dict hit) and bucketed by character bigrams; anything else only scores the
+# products that share bigrams with it (RapidFuzz, C++), then loads the winner
+# by primary key. The index is kept current through ORM events and fully
+# rebuilt every PRODUCT_INDEX_TTL seconds to pick up other workers' writes.
+
+MATCH_THRESHOLD = 60          # same cut-off as the old difflib ratio > 0.6
+MAX_CANDIDATES = 50           # products scored per query
+REFRESH_TTL = float(os.getenv("PRODUCT_INDEX_TTL", "300"))
+
+
+def _identity(text):
+    return text
+
+
+def bigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class ProductIndex:
+    def __init__(self, normalize=_identity, key_func=phonetic_key, ttl=REFRESH_TTL):
+        self.normalize = normalize
+        self.key_func = key_func
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._names = {}        # product id -> normalised name
+        self._by_name = {}      # normalised name -> product id
+        self._aliases = {}      # product id -> normalised English name
+        self._by_alias = {}     # normalised English name -> product id (brain emits "rice")
+        self._by_key = {}       # phonetic key -> set(product ids)
+        self._grams = {}        # bigram -> set(product ids)
+        self._built_at = None
+
+    # -----------------------------
+    # Maintenance
+    # -----------------------------
+    def rebuild(self, db: Session):
+        rows = db.execute(select(models.Product.id, models.Product.name_nepali, models.Product.name_english)).all()
+        self.load(rows)
+        print(f"🗂️ Product index built: {len(rows)} products")
+
+    def load(self, rows):
+        """Replace the index contents with (product_id, name[, english_name]) rows."""
+        with self._lock:
+            self._names, self._by_name, self._by_key, self._grams = {}, {}, {}, {}
+            self._aliases, self._by_alias = {}, {}
+            for row in rows:
+                self._add(*row)
+            self._built_at = time.monotonic()
+
+    def _add(self, product_id, name, alias=None):
+        if alias:
+            alias = self.normalize(alias).lower()
+            self._aliases[product_id] = alias
+            self._by_alias.setdefault(alias, product_id)
+        if not name:
+            return
+        norm = self.normalize(name)
+        self._names[product_id] = norm
+        self._by_name.setdefault(norm, product_id)
+        self._by_key.setdefault(self.key_func(norm), set()).add(product_id)
+        for gram in bigrams(norm):
+            self._grams.setdefault(gram, set()).add(product_id)
+
+    def _remove(self, product_id):
+        alias = self._aliases.pop(product_id, None)
+        if alias is not None and self._by_alias.get(alias) == product_id:
+            del self._by_alias[alias]
+        norm = self._names.pop(product_id, None)
+        if norm is None:
+            return
+        if self._by_name.get(norm) == product_id:
+            del self._by_name[norm]
+            # Another product may share the same normalised name
+            for other_id, other_norm in self._names.items():
+                if other_norm == norm:
+                    self._by_name[norm] = other_id
+                    break
+        key = self.key_func(norm)
+        same_key = self._by_key.get(key)
+        if same_key:
+            same_key.discard(product_id)
+            if not same_key:
+                del self._by_key[key]
+        for gram in bigrams(norm):
+            bucket = self._grams.get(gram)
+            if bucket:
+                bucket.discard(product_id)
+                if not bucket:
+                    del self._grams[gram]
+
+    def upsert(self, product_id, name, alias=None):
+        with self._lock:
+            self._remove(product_id)
+            self._add(product_id, name, alias)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def configure(self, normalize):
+        with self._lock:
+            self.normalize = normalize
+            self._built_at = None
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_fresh(self, db):
+        if self._built_at is None or time.monotonic() - self._built_at > self.ttl:
+            self.rebuild(db)
+
+    # -----------------------------
+    # Lookup
+    # -----------------------------
+    def match_id(self, spoken, db: Session):
+        """Best product id for the spoken name, or None."""
+        self._ensure_fresh(db)
+        spoken_norm = self.normalize(spoken)
+
+        with self._lock:
+            # 1. Exact name (Nepali, or the English name the entity matcher emits)
+            exact = self._by_name.get(spoken_norm, self._by_alias.get(spoken_norm.lower()))
+            if exact is not None:
+                return exact
+
+            # 2. Same phonetic key (थाल/टाल/दाल, छिनि/चिनी): O(1) for most ASR errors
+            same_sound = self._by_key.get(self.key_func(spoken_norm), ())
+            if len(same_sound) == 1:
+                return next(iter(same_sound))
+            if same_sound:
+                # Several products sound alike: let the scorer pick among them only
+                choices = {pid: self._names[pid] for pid in same_sound}
+                best = process.extractOne(spoken_norm, choices, scorer=fuzz.ratio)
+                return best[2]
+
+            # 3. Candidates sharing the most bigrams
+            counts = {}
+            for gram in bigrams(spoken_norm):
+                for product_id in self._grams.get(gram, ()):
+                    counts[product_id] = counts.get(product_id, 0) + 1
+            if not counts:
+                return None
+            shortlist = sorted(counts, key=counts.get, reverse=True)[:MAX_CANDIDATES]
+            choices = {pid: self._names[pid] for pid in shortlist}
+
+        # 4. Product name said inside a longer phrase ("चामल बेच")
+        contained = [pid for pid, norm in choices.items() if norm and norm in spoken_norm]
+        if contained:
+            return max(contained, key=lambda pid: len(choices[pid]))
+
+        # 5. Fuzzy score over the shortlist only
+        best = process.extractOne(spoken_norm, choices, scorer=fuzz.ratio, score_cutoff=MATCH_THRESHOLD)
+        return best[2] if best else None
+
+    def match(self, spoken, db: Session):
+        product_id = self.match_id(spoken, db)
+        if product_id is None:
+            return None
+        product = db.get(models.Product, product_id)
+        if product is None:
+            # Deleted by another worker since the last rebuild
+            self.invalidate()
+        return product
+
+    def stats(self):
+        with self._lock:
+            return {
+                "products": len(self._names),
+                "phonetic_keys": len(self._by_key),
+                "bigrams": len(self._grams),
+                "age_seconds": round(time.monotonic() - self._built_at, 1) if self._built_at else None,
+            }
+
+
+product_index = ProductIndex()
+
+
+# -----------------------------
+# Incremental refresh on ORM writes
+# -----------------------------
+@event.listens_for(models.Product, "after_insert")
+def _on_product_inserted(mapper, connection, target):
+    product_index.upsert(target.id, target.name_nepali, target.name_english)
+
+
+@event.listens_for(models.Product, "after_update")
+def _on_product_updated(mapper, connection, target):
+    # Stock changes fire this on every sale; only re-index on a rename
+    attrs = inspect(target).attrs
+    if attrs.name_nepali.history.has_changes() or attrs.name_english.history.has_changes():
+        product_index.upsert(target.id, target.name_nepali, target.name_english)
+
+
+@event.listens_for(models.Product, "after_delete")
+def _on_product_deleted(mapper, connection, target):
+    product_index.remove(target.id)
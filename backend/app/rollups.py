@@ -0,0 +1,239 @@
+import os
+import time
+import threading
+from datetime import datetime, date, timedelta
+from sqlalchemy import event, select, func, delete, update, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from . import models
+
+# ==========================================
+# 📊 DAILY SALES ROLLUP
+# ==========================================
+# /sales/stats reads `daily_sales` (one row per day) instead of scanning
+# `transactions`, so the dashboard costs the same with 1k or 10M sales.
+#
+#   on write   every SALE inserted through the ORM adds itself to its day
+#              in the same DB transaction (atomic upsert, safe for parallel
+#              counters)
+#   refresh    refresh_daily_sales() recomputes a date range from
+#              `transactions` in one GROUP BY and upserts it - for backfills
+#              and for rows written outside the ORM. SALES_ROLLUP_REFRESH_S > 0
+#              also runs it for the last two days on a timer, in one process
+#              of the deployment (see ONE RUNNER PER DEPLOYMENT).
+#
+# Days are UTC, like Transaction.timestamp.
+
+REFRESH_INTERVAL_S = float(os.getenv("SALES_ROLLUP_REFRESH_S", "0"))
+REFRESH_DAYS = 2
+
+
+def _as_date(value):
+    # func.date() gives a date on Postgres and an ISO string on SQLite
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+# ---------- ON WRITE ----------
+def _add_to_day(connection, values):
+    table = models.DailySales.__table__
+    dialect = connection.dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day],
+            set_={col: table.c[col] + stmt.excluded[col] for col in ("revenue", "cost", "sales_count", "units_sold")},
+        )
+        connection.execute(stmt)
+        return
+
+    # Other databases: update, insert if the day is new
+    increments = {col: table.c[col] + values[col] for col in ("revenue", "cost", "sales_count", "units_sold")}
+    if connection.execute(update(table).where(table.c.day == values["day"]).values(**increments)).rowcount == 0:
+        connection.execute(table.insert().values(**values))
+
+
+@event.listens_for(models.Transaction, "after_insert")
+def _roll_up_sale(mapper, connection, target):
+    if target.transaction_type != "SALE":
+        return
+    units = target.quantity or 0.0
+    cost_price = connection.execute(
+        select(models.Product.cost_price).where(models.Product.id == target.product_id)
+    ).scalar() or 0.0
+    timestamp = target.timestamp or datetime.utcnow()
+    _add_to_day(connection, {
+        "day": timestamp.date(),
+        "revenue": target.total_amount or 0.0,
+        "cost": units * cost_price,
+        "sales_count": 1,
+        "units_sold": units,
+    })
+
+
+# ---------- REFRESH ----------
+def daily_totals_query(start: date = None, end: date = None):
+    """Per-day SALE totals for [start, end] (inclusive, None = open), straight from `transactions`."""
+    T, P = models.Transaction, models.Product
+    day = func.date(T.timestamp)
+    units = func.coalesce(T.quantity, 0.0)
+
+    query = (
+        select(
+            day.label("day"),
+            func.coalesce(func.sum(T.total_amount), 0.0).label("revenue"),
+            func.coalesce(func.sum(units * func.coalesce(P.cost_price, 0.0)), 0.0).label("cost"),
+            func.count(T.id).label("sales_count"),
+            func.coalesce(func.sum(units), 0.0).label("units_sold"),
+        )
+        .outerjoin(P, P.id == T.product_id)
+        .where(T.transaction_type == "SALE")
+        .group_by(day)
+    )
+    if start is not None:
+        query = query.where(T.timestamp >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        query = query.where(T.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return query
+
+
+def _in_range(column, start, end):
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column <= end)
+    return conditions
+
+
+def refresh_daily_sales(db: Session, start: date = None, end: date = None):
+    """Recompute rollup rows for [start, end] (inclusive, None = open) from `transactions`. Returns days written."""
+    R = models.DailySales
+    table = R.__table__
+    dialect = db.get_bind().dialect.name
+    totals = daily_totals_query(start, end)
+
+    # Postgres: lock the days first. A sale already in flight commits its
+    # increment before the totals are read; one that starts later waits
+    # for this commit and then adds itself on top. (SQLite has one writer.)
+    db.execute(select(R.day).where(*_in_range(R.day, start, end)).with_for_update())
+    rows = [
+        {"day": _as_date(d), "revenue": revenue, "cost": cost, "sales_count": count, "units_sold": sold}
+        for d, revenue, cost, count, sold in db.execute(totals)
+    ]
+
+    # Upsert, never delete + insert: the row of a day that is being sold on
+    # is replaced in place, so the on-write increments can't collide with it
+    if rows and dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day],
+            set_={col: stmt.excluded[col] for col in ("revenue", "cost", "sales_count", "units_sold")},
+        )
+        db.execute(stmt, rows)
+    elif rows:
+        for row in rows:
+            if db.execute(update(table).where(table.c.day == row["day"]).values(**row)).rowcount == 0:
+                db.execute(table.insert().values(**row))
+
+    # Days in the range that no longer have any sale
+    db.execute(
+        delete(R)
+        .where(*_in_range(R.day, start, end), R.day.notin_([row["day"] for row in rows]))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return len(rows)
+
+
+def backfill_if_empty(session_factory):
+    """First start after the rollup was added: build it from the whole history."""
+    db = session_factory()
+    try:
+        if db.query(models.DailySales.day).first() is None and db.query(models.Transaction.id).first() is not None:
+            days = refresh_daily_sales(db)
+            print(f"📊 Sales rollup backfilled: {days} days")
+    finally:
+        db.close()
+
+
+# ---------- ONE RUNNER PER DEPLOYMENT ----------
+# Every worker process starts the rollup jobs, but only the one holding the
+# runner lock backfills and refreshes; the others retry the lock every
+# interval, so the job moves on if that worker dies.
+#   Postgres   session advisory lock, held on one connection of the runner
+#   SQLite     exclusive flock on <database>.rollup.lock (no fcntl: Windows
+#              dev setups run a single process anyway)
+RUNNER_LOCK_KEY = 727_001  # pg advisory lock id for the rollup runner
+
+
+class _RunnerLock:
+    def __init__(self, engine):
+        self.engine = engine
+        self._conn = None
+        self._file = None
+
+    def acquire(self):
+        if self.engine.dialect.name == "postgresql":
+            conn = self.engine.connect()
+            if conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": RUNNER_LOCK_KEY}).scalar():
+                conn.commit()
+                self._conn = conn
+                return True
+            conn.close()
+            return False
+        database = self.engine.url.database
+        if fcntl is None or not database or database == ":memory:":
+            return True
+        handle = open(f"{database}.rollup.lock", "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._file = handle
+        return True
+
+    def release(self):
+        if self._conn is not None:
+            self._conn.close()  # ends the session: the advisory lock goes with it
+            self._conn = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def run_rollup_jobs(engine, session_factory, interval=REFRESH_INTERVAL_S):
+    """Backfill once, then (SALES_ROLLUP_REFRESH_S > 0) refresh the last days on a timer, in one process only."""
+    lock = _RunnerLock(engine)
+    while not lock.acquire():
+        if interval <= 0:
+            return  # another process is doing the backfill
+        time.sleep(interval)
+    try:
+        backfill_if_empty(session_factory)
+        while interval > 0:
+            time.sleep(interval)
+            db = session_factory()
+            try:
+                refresh_daily_sales(db, start=datetime.utcnow().date() - timedelta(days=REFRESH_DAYS - 1))
+            except Exception as e:
+                print(f"⚠️ Sales rollup refresh failed: {e}")
+            finally:
+                db.close()
+    finally:
+        lock.release()
+
+
+def start_rollup_jobs(engine, session_factory, interval=REFRESH_INTERVAL_S):
+    thread = threading.Thread(target=run_rollup_jobs, args=(engine, session_factory, interval), daemon=True, name="sales-rollup")
+    thread.start()
+    return thread
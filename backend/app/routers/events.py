@@ -0,0 +1,48 @@
+import json
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from ..events import stock_events, KEEPALIVE_S
+
+router = APIRouter(
+    prefix="/events",
+    tags=["Events"]
+)
+
+
+def _sse(item):
+    # Stock changes carry their catalogue version as the event id
+    kind = item.get("type", "stock")
+    lines = [f"event: {kind}"]
+    if item.get("version") is not None:
+        lines.append(f"id: {item['version']}")
+    lines.append(f"data: {json.dumps(item)}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+async def stream_stock_events():
+    with stock_events.subscribe() as sub:
+        yield b"retry: 3000\n\n"
+        while True:
+            item = await sub.get(timeout=KEEPALIVE_S)
+            # Comment line keeps proxies from closing an idle stream
+            yield b": keepalive\n\n" if item is None else _sse(item)
+
+
+@router.get("/stock")
+async def stock_event_stream():
+    # Server-Sent Events: new EventSource("/events/stock")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream_stock_events(), media_type="text/event-stream", headers=headers)
+
+
+@router.websocket("/stock/ws")
+async def stock_event_socket(websocket: WebSocket):
+    # Same feed as JSON messages, for clients that already hold a WebSocket
+    await websocket.accept()
+    with stock_events.subscribe() as sub:
+        try:
+            while True:
+                item = await sub.get(timeout=KEEPALIVE_S)
+                await websocket.send_json(item if item is not None else {"type": "keepalive"})
+        except WebSocketDisconnect:
+            pass
@@ -1,13 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from ..database import get_db
+from sqlalchemy import select
+from ..database import SessionLocal
 from ..models import Product
-import io
+from ..pdf_stream import StreamingPDF, fill_rect, stroke_rect, text
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from datetime import datetime
 
 router = APIRouter(
@@ -15,71 +14,128 @@ router = APIRouter(
     tags=["Reports"]
 )
 
+# --- LAYOUT ---
+# Rows are streamed from the DB in batches (yield_per) and each PDF page is
+# sent as soon as it is full, so memory holds one page + one batch no
+# matter how big the catalogue is.
+PAGE_WIDTH, PAGE_HEIGHT = letter
+MARGIN = 54
+ROW_HEIGHT = 18
+FONT_SIZE = 10
+DB_BATCH_SIZE = 500
+
+COLUMNS = [("Product Name", 180), ("Stock", 70), ("Unit", 60), ("Cost Price", 90), ("Total Value", 104)]
+TABLE_WIDTH = sum(width for _, width in COLUMNS)
+TABLE_LEFT = (PAGE_WIDTH - TABLE_WIDTH) / 2
+
+HEADER_BG = colors.grey.rgb()
+HEADER_FG = colors.whitesmoke.rgb()
+ROW_BG = colors.beige.rgb()
+TOTAL_BG = colors.lightgrey.rgb()
+
+
+def _fit(value, width, font):
+    # Trim text that would spill out of its cell
+    value = str(value)
+    limit = width - 6
+    if stringWidth(value, font, FONT_SIZE) <= limit:
+        return value
+    # Longest prefix that still fits with the ellipsis (binary search)
+    low, high = 0, len(value)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if stringWidth(value[:mid] + "...", font, FONT_SIZE) <= limit:
+            low = mid
+        else:
+            high = mid - 1
+    return value[:low] + "..."
+
+
+def _row(y, cells, bold=False, background=ROW_BG, foreground=(0, 0, 0)):
+    font_name, font = ("Helvetica-Bold", "F2") if bold else ("Helvetica", "F1")
+    ops = [fill_rect(TABLE_LEFT, y, TABLE_WIDTH, ROW_HEIGHT, background)]
+    x = TABLE_LEFT
+    for (_, width), value in zip(COLUMNS, cells):
+        value = _fit(value, width, font_name)
+        # Centered, like the old ReportLab table
+        text_x = x + (width - stringWidth(value, font_name, FONT_SIZE)) / 2
+        ops.append(text(text_x, y + 5, value, font=font, size=FONT_SIZE, rgb=foreground))
+        ops.append(stroke_rect(x, y, width, ROW_HEIGHT))
+        x += width
+    return b"".join(ops)
+
+
+def _title(report_date):
+    lines = [("ABC Company Ltd.", 18), (f"Inventory Report - {report_date}", 18)]
+    ops, y = [], PAGE_HEIGHT - MARGIN - 18
+    for line, size in lines:
+        x = (PAGE_WIDTH - stringWidth(line, "Helvetica-Bold", size)) / 2
+        ops.append(text(x, y, line, font="F2", size=size))
+        y -= size + 6
+    return b"".join(ops), y - 12
+
+
+def stream_inventory_report():
+    pdf = StreamingPDF(PAGE_WIDTH, PAGE_HEIGHT)
+    yield pdf.begin()
+
+    # Own session: the response body outlives the request's dependencies
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(Product.name_english, Product.quantity, Product.unit, Product.cost_price)
+            .order_by(Product.id)
+            .execution_options(yield_per=DB_BATCH_SIZE)
+        )
+
+        title_ops, top = _title(datetime.now().strftime('%Y-%m-%d'))
+        header = [name for name, _ in COLUMNS]
+        grand_total_value = 0.0
+
+        def new_page(first):
+            ops = [title_ops] if first else []
+            y = (top if first else PAGE_HEIGHT - MARGIN) - ROW_HEIGHT
+            ops.append(_row(y, header, bold=True, background=HEADER_BG, foreground=HEADER_FG))
+            return ops, y
+
+        ops, y = new_page(first=True)
+        for name_english, quantity, unit, cost_price in rows:
+            quantity, cost_price = quantity or 0.0, cost_price or 0.0
+            stock_value = quantity * cost_price
+            grand_total_value += stock_value
+
+            y -= ROW_HEIGHT
+            if y < MARGIN:
+                yield pdf.page(b"".join(ops))
+                ops, y = new_page(first=False)
+                y -= ROW_HEIGHT
+
+            ops.append(_row(y, [
+                name_english or "",  # Using English to avoid font issues with Nepali
+                f"{quantity}",
+                unit or "",
+                f"Rs. {cost_price}",
+                f"Rs. {stock_value}",
+            ]))
+
+        # Grand Total Row
+        y -= ROW_HEIGHT
+        if y < MARGIN:
+            yield pdf.page(b"".join(ops))
+            ops, y = new_page(first=False)
+            y -= ROW_HEIGHT
+        ops.append(_row(y, ["", "", "", "GRAND TOTAL:", f"Rs. {grand_total_value}"], bold=True, background=TOTAL_BG))
+        yield pdf.page(b"".join(ops))
+    finally:
+        db.close()
+
+    yield pdf.end()
+
+
 @router.get("/generate")
-def generate_inventory_report(db: Session = Depends(get_db)):
-    # 1. Fetch Data
-    products = db.query(Product).all()
-    
-    # 2. Create a memory buffer for the PDF (instead of saving to disk)
-    buffer = io.BytesIO()
-    
-    # 3. Setup the PDF Document
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # --- TITLE --
-    title = Paragraph(f"ABC Company Ltd.<br/>Inventory Report - {datetime.now().strftime('%Y-%m-%d')}", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 12))
-    
-    # --- PREPARE TABLE DATA ---
-    # Header Row
-    data = [["Product Name", "Stock", "Unit", "Cost Price", "Total Value"]]
-    
-    grand_total_value = 0.0
-    
-    for p in products:
-        stock_value = p.quantity * p.cost_price
-        grand_total_value += stock_value
-        
-        # Add Row
-        data.append([
-            p.name_english,  # Using English to avoid font issues with Nepali
-            f"{p.quantity}",
-            p.unit,
-            f"Rs. {p.cost_price}",
-            f"Rs. {stock_value}"
-        ])
-        
-    # Add Grand Total Row
-    data.append(["", "", "", "GRAND TOTAL:", f"Rs. {grand_total_value}"])
-    
-    # --- CREATE TABLE STYLE ---
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        # Highlight Total Row
-        ('FONTNAME', (-2, -1), (-1, -1), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-    ]))
-    
-    elements.append(table)
-    
-    # 4. Build PDF
-    doc.build(elements)
-    
-    # 5. Prepare buffer for download
-    buffer.seek(0)
-    
-    # 6. Return as a Downloadable File
+def generate_inventory_report():
+    # Bytes go out page by page (chunked transfer), no full-document buffer
     headers = {
         'Content-Disposition': f'attachment; filename="Inventory_Report_{datetime.now().strftime("%Y%m%d")}.pdf"'
     }
-    return StreamingResponse(buffer, headers=headers, media_type='application/pdf')
\ No newline at end of file
+    return StreamingResponse(stream_inventory_report(), headers=headers, media_type='application/pdf')
@@ -1,36 +1,113 @@
-from fastapi import APIRouter, Depends
+import base64
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, tuple_
 from ..database import get_db
-from ..models import Transaction, Product
+from ..models import Transaction, Product, DailySales
+from .. import schemas
 
 router = APIRouter(
     prefix="/sales",
     tags=["Sales Dashboard"]
 )
 
-@router.get("/stats")
-def get_sales_stats(db: Session = Depends(get_db)):
-    # 1. Total Revenue (Sum of all SALES)
-    total_revenue = db.query(func.sum(Transaction.total_value))\
-        .filter(Transaction.transaction_type == "SALE").scalar() or 0.0
+LOW_STOCK_THRESHOLD = 5  # kg / units
 
-    # 2. Total Items Sold
-    total_items_sold = db.query(func.count(Transaction.id))\
-        .filter(Transaction.transaction_type == "SALE").scalar() or 0
+def stats_query(start: Optional[date] = None, end: Optional[date] = None):
+    """Revenue, cost, sales count and low-stock count in one SELECT (shared with scripts/check_query_plans.py)."""
+    # Revenue, profit and count from the daily rollup (see app/rollups.py)
+    # plus the low-stock count as a subquery
+    low_stock = select(func.count(Product.id))\
+        .where(Product.quantity < LOW_STOCK_THRESHOLD).scalar_subquery()
 
-    # 3. Low Stock Items (Less than 5 kg)
-    low_stock = db.query(func.count(Product.id))\
-        .filter(Product.quantity < 5).scalar() or 0
+    query = select(
+        func.coalesce(func.sum(DailySales.revenue), 0.0),
+        func.coalesce(func.sum(DailySales.cost), 0.0),
+        func.coalesce(func.sum(DailySales.sales_count), 0),
+        low_stock,
+    )
+    if start is not None:
+        query = query.where(DailySales.day >= start)
+    if end is not None:
+        query = query.where(DailySales.day <= end)
+    return query
+
+@router.get("/stats", response_model=schemas.SalesStats)
+def get_sales_stats(start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_db)):
+    # One round trip
+    revenue, cost, count, low = db.execute(stats_query(start, end)).one()
 
     return {
-        "total_revenue": total_revenue,
-        "total_sales_count": total_items_sold,
-        "low_stock_alerts": low_stock
+        "period": f"{start or '…'} → {end or '…'}" if (start or end) else "all time",
+        "total_revenue": revenue,
+        "total_profit": revenue - cost,
+        "sales_count": count,
+        "total_sales_count": count,   # name used before the rollup; kept for existing clients
+        "low_stock_alerts": low or 0
     }
 
-@router.get("/history")
-def get_sales_history(db: Session = Depends(get_db)):
-    # Get last 10 transactions
-    history = db.query(Transaction).order_by(Transaction.timestamp.desc()).limit(10).all()
-    return history
\ No newline at end of file
+# --- HISTORY (keyset pagination) ---
+# Pages are cut on (timestamp, id) instead of OFFSET, so page 5,000 costs
+# the same as page 1: the (timestamp, id) and (type / product, timestamp)
+# indexes find the next rows directly. `next_cursor` is opaque to clients.
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def history_query(limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None,
+                  transaction_type: Optional[str] = None, product_id: Optional[int] = None,
+                  start: Optional[date] = None, end: Optional[date] = None):
+    # One query: transaction columns + product name via a join (no lazy loads)
+    query = (
+        select(
+            Transaction.id,
+            func.coalesce(Product.name_nepali, Product.name, Product.name_english, "").label("item_name"),
+            func.coalesce(Transaction.quantity, 0.0).label("quantity"),
+            func.coalesce(Transaction.total_amount, 0.0).label("total_amount"),
+            Transaction.timestamp,
+        )
+        .outerjoin(Product, Product.id == Transaction.product_id)
+        .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+        .limit(limit)
+    )
+    if transaction_type:
+        query = query.where(Transaction.transaction_type == transaction_type.upper())
+    if product_id is not None:
+        query = query.where(Transaction.product_id == product_id)
+    if start is not None:
+        query = query.where(Transaction.timestamp >= datetime.combine(start, time.min))
+    if end is not None:
+        query = query.where(Transaction.timestamp < datetime.combine(end + timedelta(days=1), time.min))
+    if cursor:
+        after_timestamp, after_id = decode_cursor(cursor)
+        query = query.where(tuple_(Transaction.timestamp, Transaction.id) < tuple_(after_timestamp, after_id))
+    return query
+
+@router.get("/history", response_model=schemas.SalesHistoryPage)
+def get_sales_history(
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    transaction_type: Optional[str] = Query(None, alias="type", description="SALE or PURCHASE"),
+    product_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    # Fetch one extra row to know whether another page exists
+    rows = db.execute(history_query(limit + 1, cursor, transaction_type, product_id, start, end)).all()
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1].timestamp, items[-1].id) if len(rows) > limit else None
+    return {"items": [dict(row._mapping) for row in items], "next_cursor": next_cursor}
@@ -0,0 +1,68 @@
+from fastapi import APIRouter
+from ..asr import registry, batcher, remote_client
+from ..product_index import product_index
+from ..database import engine, pool_metrics
+from .. import workers
+from .. import threads
+from ..fingerprint import audio_fingerprints
+from ..events import stock_events
+
+try:
+    from ..brain import parse_cache
+except ImportError:
+    parse_cache = None
+
+router = APIRouter(
+    prefix="/system",
+    tags=["System"]
+)
+
+@router.get("/models")
+def get_model_stats():
+    # Load time & resident memory per Whisper size (for sizing worker pods)
+    return registry.stats()
+
+@router.get("/asr")
+async def get_asr_queue_stats():
+    # Micro-batching queue: depth, batches run, average batch size
+    remote = remote_client()
+    if remote is not None:
+        # Out-of-process ASR: the queue lives in the service
+        return {"remote": remote.stats(), "service": await remote.remote_stats()}
+    return batcher.stats()
+
+@router.get("/workers")
+def get_worker_pool_stats():
+    # Per-stage queue depth and rejections (429s) for the inference pools
+    return workers.stats()
+
+@router.get("/threads")
+def get_thread_stats():
+    # Torch intra/inter-op threads per model (set via TORCH_THREADS & co.)
+    return threads.stats()
+
+@router.get("/brain-cache")
+def get_brain_cache_stats():
+    # Hit rate of the memoised intent/entity parse
+    if parse_cache is None:
+        return {"enabled": False}
+    return parse_cache.stats()
+
+@router.get("/fingerprints")
+def get_fingerprint_cache_stats():
+    # Retried uploads served from cache (transcripts) and replayed ADD/SALE responses
+    return audio_fingerprints.stats()
+
+@router.get("/events")
+def get_stock_event_stats():
+    # Live feed subscribers and events dropped for slow clients
+    return stock_events.stats()
+
+@router.get("/product-index")
+def get_product_index_stats():
+    return product_index.stats()
+
+@router.get("/db-pool")
+def get_db_pool_stats():
+    # Checkout wait (p50/p99) and connections in use, to size DB_POOL_SIZE
+    return pool_metrics.snapshot(engine.pool)
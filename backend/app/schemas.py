@@ -19,6 +19,8 @@ class ProductCreate(ProductBase):
 
 class ProductResponse(ProductBase):
     id: int
+    name_nepali: Optional[str] = None   # rows added via inventory.py's raw SQL may have none
+    version: Optional[int] = None
     class Config:
         from_attributes = True
 
@@ -30,6 +32,8 @@ class SalesStats(BaseModel):
     total_revenue: float
     total_profit: float
     sales_count: int
+    total_sales_count: int = 0
+    low_stock_alerts: int = 0
 
 # For the "Item Lists" (History)
 class SaleItem(BaseModel):
@@ -41,6 +45,11 @@ class SaleItem(BaseModel):
     
     class Config:
         from_attributes = True
+
+# One page of /sales/history (pass next_cursor back to get the next page)
+class SalesHistoryPage(BaseModel):
+    items: List[SaleItem]
+    next_cursor: Optional[str] = None
         
         
 class UserCreate(BaseModel):
@@ -0,0 +1,88 @@
+import os
+from datetime import datetime
+from sqlalchemy import update, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import models
+from .catalog import next_version, advance
+from . import events
+
+# ==========================================
+# 📦 ATOMIC STOCK CHANGES
+# ==========================================
+# Stock is never read into Python, changed, and written back. Each change
+# is one conditional statement:
+#
+#   UPDATE inventory SET quantity = quantity - :q
+#    WHERE id = :id AND quantity >= :q
+#   RETURNING quantity
+#
+# so two counters selling the same SKU can neither oversell nor lose an
+# update, whatever the request ordering. STOCK_LOCKING=row switches to
+# SELECT ... FOR UPDATE for deployments that want explicit row locks.
+
+LOCKING_MODES = ("conditional", "row")
+LOCKING_MODE = os.getenv("STOCK_LOCKING", "conditional").strip().lower()
+
+
+class InsufficientStock(Exception):
+    def __init__(self, available):
+        super().__init__(f"Only {available} left in stock")
+        self.available = available
+
+
+def adjust_stock(db: Session, product, delta: float, locking: str = None):
+    """
+    Add `delta` (negative for a sale) to the product's stock inside the
+    current transaction and return the new quantity. Raises
+    InsufficientStock if a sale would take the quantity below zero.
+    """
+    locking = locking or LOCKING_MODE
+    # The new catalogue version is drawn by the UPDATE itself (app/catalog.py):
+    # a refused sale writes no row and moves no version or ETag
+    if locking == "row":
+        new_qty, version = _adjust_with_row_lock(db, product.id, delta)
+    else:
+        new_qty, version = _adjust_conditional(db, product.id, delta)
+
+    # Keep the in-session object in step without marking it dirty
+    # (a later flush must not write the old value back)
+    set_committed_value(product, "quantity", new_qty)
+    set_committed_value(product, "version", version)
+    # Pushed to the live dashboards once (and only if) this transaction commits
+    events.stage(db, product.id, new_qty, delta, version)
+    return new_qty
+
+
+def _adjust_conditional(db, product_id, delta):
+    stmt = (
+        update(models.Product)
+        .where(models.Product.id == product_id)
+        .values(quantity=models.Product.quantity + delta, version=next_version(), updated_at=datetime.utcnow())
+        .returning(models.Product.quantity, models.Product.version)
+        .execution_options(synchronize_session=False)
+    )
+    if delta < 0:
+        stmt = stmt.where(models.Product.quantity >= -delta)
+
+    row = db.execute(stmt).first()
+    if row is None:
+        available = db.execute(
+            select(models.Product.quantity).where(models.Product.id == product_id)
+        ).scalar()
+        raise InsufficientStock(available or 0.0)
+    advance(db)
+    return row.quantity, row.version
+
+
+def _adjust_with_row_lock(db, product_id, delta):
+    # Take the row lock first (queues competing sellers on Postgres), then
+    # apply the same guarded UPDATE. Databases that ignore FOR UPDATE
+    # (SQLite) are still protected by the WHERE clause.
+    db.execute(
+        select(models.Product.id)
+        .where(models.Product.id == product_id)
+        .with_for_update()
+    )
+    return _adjust_conditional(db, product_id, delta)
@@ -0,0 +1,131 @@
+import os
+from collections import deque
+import numpy as np
+
+from .audio import SAMPLE_RATE, VAD_MIN_DB, frame_levels_db
+
+# ==========================================
+# 🎙️ STREAMING UTTERANCE SEGMENTER (/ws/voice)
+# ==========================================
+# The app streams raw PCM while the shopkeeper talks. Every 30 ms frame is
+# classified speech / silence against an adaptive noise floor:
+#
+#   speech starts  after START_MS of consecutive loud frames (the PRE_ROLL_MS
+#                  before it is kept so the first syllable isn't clipped)
+#   speech ends    after END_SILENCE_MS of quiet, or at MAX_UTTERANCE_S
+#                  (one Whisper window), whichever comes first
+#
+# While speech is running the caller decodes the utterance-so-far every
+# PARTIAL_EVERY_MS for live partials; on "end" it decodes once more and
+# executes the command.
+
+FRAME_MS = 30
+START_MS = 90
+PRE_ROLL_MS = 300
+END_SILENCE_MS = int(os.getenv("STREAM_END_SILENCE_MS", "700"))
+PARTIAL_EVERY_MS = int(os.getenv("STREAM_PARTIAL_MS", "700"))
+MAX_UTTERANCE_S = 28.0
+
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "12"))  # how far above the noise floor speech must be
+NOISE_ADAPT = 0.05                                      # EMA weight of a new quiet frame
+
+
+class UtteranceSegmenter:
+    def __init__(self, sr=SAMPLE_RATE):
+        self.sr = sr
+        self.frame_len = sr * FRAME_MS // 1000
+        self.start_frames = max(1, START_MS // FRAME_MS)
+        self.end_frames = max(1, END_SILENCE_MS // FRAME_MS)
+        self.max_frames = int(MAX_UTTERANCE_S * 1000) // FRAME_MS
+        self.partial_frames = max(1, PARTIAL_EVERY_MS // FRAME_MS)
+
+        self._leftover = np.zeros(0, dtype=np.float32)
+        self._pre_roll = deque(maxlen=max(1, PRE_ROLL_MS // FRAME_MS) + self.start_frames)
+        self._speech = []
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._frames_since_partial = 0
+        self.noise_db = None
+        self.in_speech = False
+
+    @property
+    def threshold_db(self):
+        if self.noise_db is None:
+            return VAD_MIN_DB
+        return max(VAD_MIN_DB, self.noise_db + VAD_MARGIN_DB)
+
+    def feed(self, samples):
+        """
+        Push float32 samples. Returns a list of events:
+        ("start", None) when speech begins, ("end", audio) when an utterance is complete.
+        """
+        if len(self._leftover):
+            samples = np.concatenate([self._leftover, samples])
+        n_frames = len(samples) // self.frame_len
+        self._leftover = samples[n_frames * self.frame_len:].copy()
+        if n_frames == 0:
+            return []
+
+        levels = frame_levels_db(samples, self.frame_len)
+        frames = samples[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+
+        events = []
+        for frame, level in zip(frames, levels):
+            loud = level > self.threshold_db
+            if not self.in_speech:
+                self._pre_roll.append(frame)
+                self._voiced_run = self._voiced_run + 1 if loud else 0
+                if not loud:
+                    self._track_noise(level)
+                if self._voiced_run >= self.start_frames:
+                    self.in_speech = True
+                    self._speech = list(self._pre_roll)
+                    self._pre_roll.clear()
+                    self._silent_run = 0
+                    self._frames_since_partial = len(self._speech)
+                    events.append(("start", None))
+                continue
+
+            self._speech.append(frame)
+            self._frames_since_partial += 1
+            self._silent_run = 0 if loud else self._silent_run + 1
+            if self._silent_run >= self.end_frames or len(self._speech) >= self.max_frames:
+                events.append(("end", self._finish()))
+        return events
+
+    def _track_noise(self, level):
+        if self.noise_db is None:
+            self.noise_db = float(level)
+        else:
+            self.noise_db += NOISE_ADAPT * (float(level) - self.noise_db)
+
+    def partial_due(self):
+        return self.in_speech and self._frames_since_partial >= self.partial_frames
+
+    def utterance(self):
+        """Speech captured so far in the current utterance (for a partial decode)."""
+        self._frames_since_partial = 0
+        if not self._speech:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self._speech)
+
+    def flush(self):
+        """Client said it stopped talking: close the current utterance now (None if silent)."""
+        if not self.in_speech:
+            return None
+        if len(self._leftover):
+            self._speech.append(self._leftover)
+            self._leftover = np.zeros(0, dtype=np.float32)
+        return self._finish()
+
+    def _finish(self):
+        # Keep a little of the trailing silence, Whisper likes a soft ending
+        drop_tail = max(0, self._silent_run - max(1, 150 // FRAME_MS))
+        speech = self._speech[:len(self._speech) - drop_tail] if drop_tail else self._speech
+        audio = np.concatenate(speech) if speech else np.zeros(0, dtype=np.float32)
+        self._speech = []
+        self._silent_run = 0
+        self._voiced_run = 0
+        self._frames_since_partial = 0
+        self.in_speech = False
+        return audio
@@ -0,0 +1,156 @@
+import os
+import threading
+from contextlib import contextmanager
+
+# ==========================================
+# 🧵 TORCH THREAD BUDGET
+# ==========================================
+# By default torch gives every op all the cores. With Whisper and BERT
+# running side by side on their worker pools (app/workers.py) that means
+# several thread teams fighting for the same cores. Here the process gets
+# a CPU budget, and optionally each model a fixed share of it:
+#
+#   TORCH_THREADS          intra-op budget of this process
+#                          (default: usable cores / WEB_CONCURRENCY)
+#   TORCH_PIN_STAGES       1 = give each model its own share below
+#                          (default 0: all models share the budget)
+#   ASR_TORCH_THREADS      threads per Whisper decode
+#                          (default: what NLU leaves, split over ASR_WORKERS)
+#   NLU_TORCH_THREADS      threads per BERT call (default 1: short texts
+#                          gain little from more)
+#   TORCH_INTEROP_THREADS  inter-op pool (default 1; nothing here runs
+#                          independent ops in parallel)
+#
+# configure() applies the budget once per process: in gunicorn's post_fork
+# for each worker, otherwise in the app's startup hook. It never runs at
+# import, because under preloading that would be the pre-fork master.
+#
+# Per-stage counts are opt-in (TORCH_PIN_STAGES=1). Without it every model
+# call uses the whole budget, as a single-model process would. With it,
+# `with pinned("asr"/"nlu"):` wraps each model call and sets the calling
+# thread's count for that call only. torch.set_num_threads also sets the
+# process-wide default that new threads start from, so pinned() puts the
+# budget back on exit; otherwise every later thread would inherit
+# whichever stage pinned last. Per-thread counts need OpenMP (the standard
+# Linux/Windows wheels). Other parallel backends only honour the
+# process-wide value, so pinned() does nothing there.
+#
+# Measured with scripts/benchmark_threads.py on the 1-core dev box
+# (budget 1, so only pinning on vs off can differ), 200 /command
+# requests, concurrency 4, two runs each:
+#   shared (off)  p50 148-166 ms, p99 189-241 ms, 23.4-27.1 req/s
+#   1:1 (on)      p50 160-161 ms, p99 209-254 ms, 24.3-24.8 req/s
+# i.e. no difference beyond run-to-run noise. /voice has not been
+# measured: the Whisper weights can't be downloaded on that box. Record
+# /voice next to /command on a multi-core box before making pinning the
+# default.
+
+STAGES = ("asr", "nlu")
+PIN_STAGES = os.getenv("TORCH_PIN_STAGES", "0").strip().lower() in ("1", "true", "yes")
+
+_plan = None
+_per_thread = False
+_lock = threading.Lock()
+
+
+def _env_int(name):
+    raw = os.getenv(name, "").strip()
+    return max(1, int(raw)) if raw else None
+
+
+def usable_cores():
+    try:
+        return len(os.sched_getaffinity(0))  # respects container CPU sets
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cpu_budget(worker_processes=None):
+    """Intra-op threads for one process when `worker_processes` share the machine."""
+    if worker_processes is None:
+        # Read by both `uvicorn --workers` and gunicorn.conf.py
+        worker_processes = _env_int("WEB_CONCURRENCY") or 1
+    return _env_int("TORCH_THREADS") or max(1, usable_cores() // max(1, worker_processes))
+
+
+def plan(budget=None, stages=STAGES):
+    """Threads per model for a process with `budget` cores running `stages`."""
+    from .workers import ASR_WORKERS, NLU_WORKERS
+
+    budget = budget or cpu_budget()
+    result = {"budget": budget, "interop": _env_int("TORCH_INTEROP_THREADS") or 1}
+
+    if "nlu" in stages:
+        # Alone (ASR out of process), BERT may use the whole budget
+        default = 1 if "asr" in stages else max(1, budget // NLU_WORKERS)
+        result["nlu"] = _env_int("NLU_TORCH_THREADS") or default
+    if "asr" in stages:
+        left = budget - result.get("nlu", 0) * NLU_WORKERS
+        result["asr"] = _env_int("ASR_TORCH_THREADS") or max(1, left // ASR_WORKERS)
+    return result
+
+
+def configure(budget=None, stages=STAGES):
+    """Apply the budget to this process (call before any inference)."""
+    global _plan, _per_thread
+    import torch
+
+    with _lock:
+        _plan = plan(budget, stages)
+        _per_thread = PIN_STAGES and parallel_backend() == "OpenMP"
+        torch.set_num_threads(_plan["budget"])
+        try:
+            torch.set_num_interop_threads(_plan["interop"])
+        except RuntimeError:
+            pass  # already fixed (set before a fork, or inter-op work has run)
+    if _per_thread:
+        shares = ", ".join(f"{stage} {_plan[stage]}" for stage in STAGES if stage in _plan)
+    else:
+        shares = "shared by all models"
+    print(f"🧵 Torch threads: budget {_plan['budget']} ({shares}), inter-op {_plan['interop']}")
+    return _plan
+
+
+def configured():
+    return _plan is not None
+
+
+@contextmanager
+def pinned(stage):
+    """Run the block with the stage's intra-op thread count on the calling thread."""
+    current = _plan or configure()
+    if not _per_thread:
+        yield  # one process-wide pool: configure() already sized it
+        return
+    import torch
+    # Let torch initialise this thread first, or it resets the count on first use
+    torch.get_num_threads()
+    torch.set_num_threads(current.get(stage, current["budget"]))
+    try:
+        yield
+    finally:
+        # Also resets the default new threads start from (see the header)
+        torch.set_num_threads(current["budget"])
+
+
+def parallel_backend():
+    import torch
+
+    for line in torch.__config__.parallel_info().splitlines():
+        if line.startswith("ATen parallel backend"):
+            return line.split(":", 1)[1].strip()
+    return "unknown"
+
+
+def stats():
+    import torch
+
+    return {
+        "plan": _plan,
+        "usable_cores": usable_cores(),
+        "parallel_backend": parallel_backend(),
+        "pin_stages": PIN_STAGES,
+        "per_thread_pinning": _per_thread,
+        "process_threads": torch.get_num_threads(),
+        "interop_threads": torch.get_num_interop_threads(),
+    }
@@ -0,0 +1,109 @@
+import os
+import math
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# ==========================================
+# 🧵 BOUNDED INFERENCE POOLS
+# ==========================================
+# Whisper and BERT are CPU-bound. Running them inline in an `async def`
+# endpoint freezes the event loop, so every other request (dashboard
+# /products polls included) waits behind one voice clip.
+#
+# Each stage gets its own small thread pool (torch releases the GIL) and a
+# hard cap on work in flight. Past the cap the request is refused at once
+# with PoolSaturated -> HTTP 429 + Retry-After, instead of queueing forever.
+
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "1"))            # batching already uses the cores
+ASR_MAX_PENDING = int(os.getenv("ASR_MAX_PENDING", "32"))   # clips waiting or decoding
+NLU_WORKERS = int(os.getenv("NLU_WORKERS", "2"))
+NLU_MAX_PENDING = int(os.getenv("NLU_MAX_PENDING", "64"))
+
+
+class PoolSaturated(Exception):
+    def __init__(self, stage, retry_after):
+        super().__init__(f"{stage} queue is full, retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StagePool:
+    def __init__(self, name, workers, max_pending):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.max_pending = max(self.workers, int(max_pending))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self.in_flight = 0      # admitted and not finished (queued + running)
+        self.running = 0        # currently on a worker thread
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    def retry_after(self):
+        """Seconds until the backlog should have drained, from the average task time."""
+        avg = self.busy_seconds / self.completed if self.completed else 1.0
+        return max(1, math.ceil(avg * self.in_flight / self.workers))
+
+    @contextmanager
+    def admit(self):
+        """Reserve a slot for one unit of work or raise PoolSaturated."""
+        with self._lock:
+            if self.in_flight >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated(self.name, self.retry_after())
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def call(self, fn, *args):
+        """Run `fn` on the calling worker thread, recording time and occupancy."""
+        with self._lock:
+            self.running += 1
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.busy_seconds += time.perf_counter() - started
+
+    async def run_in_worker(self, fn, *args):
+        """Execute on this pool without taking an admission slot (caller already holds one)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.call, fn, *args)
+
+    async def run(self, fn, *args):
+        with self.admit():
+            return await self.run_in_worker(fn, *args)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self.in_flight,
+                "running": self.running,
+                "queue_depth": max(0, self.in_flight - self.running),
+                "peak_in_flight": self.peak_in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_task_ms": round(self.busy_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            }
+
+
+asr_pool = StagePool("asr", ASR_WORKERS, ASR_MAX_PENDING)
+nlu_pool = StagePool("nlu", NLU_WORKERS, NLU_MAX_PENDING)
+
+
+def stats():
+    return {pool.name: pool.stats() for pool in (asr_pool, nlu_pool)}
@@ -0,0 +1,93 @@
+import os
+import gc
+
+# ==========================================
+# 🍴 PRE-FORK MULTI-WORKER DEPLOYMENT
+# ==========================================
+# `uvicorn app.main:app --workers N` has each worker import the app (and
+# load DistilBERT + Whisper) on its own: N copies of the weights. Here the
+# master imports app.main and loads the models ONCE, then forks the
+# workers, which share the weight pages copy-on-write (tensors are never
+# written after loading, so the pages stay shared):
+#
+#   cd backend
+#   WEB_CONCURRENCY=4 WHISPER_WARMUP=small gunicorn -c gunicorn.conf.py
+#
+#   WEB_CONCURRENCY    worker processes (default 2)
+#   WHISPER_WARMUP     Whisper sizes to load in the master before forking;
+#                      sizes not listed still load lazily, per worker
+#   PRELOAD_MODELS     false = old behaviour (every worker loads its own)
+#   TORCH_THREADS      torch intra-op budget per worker (default: CPU
+#                      cores / workers; TORCH_PIN_STAGES=1 splits it
+#                      between Whisper and BERT, see app/threads.py)
+#   BIND               default 0.0.0.0:8000
+#
+# Only app.main (and what it imports: app.brain, app.asr) is preloaded;
+# app.inventory is not mounted and is never loaded. With ASR_SERVICE_SOCKET
+# set, Whisper runs in app.asr_service and only DistilBERT is preloaded.
+#
+# Memory: RSS counts shared pages in every process, so compare PSS (shared
+# pages split between the processes using them) with
+#   python scripts/measure_worker_memory.py --workers 1 2 4 8
+# which starts this config with and without preloading and prints total
+# PSS/RSS and per-worker private memory for each worker count. Measured
+# with DistilBERT only (no Whisper sizes loaded), SQLite, 20 /command calls:
+#
+#   workers   total PSS preload   total PSS no-preload   per-worker USS
+#      1           1023 MB              1014 MB          206 / 990 MB
+#      2           1056 MB              1508 MB           34 / 502 MB
+#      4           1129 MB              2529 MB           34 / 506 MB
+#      8           1253 MB              4480 MB           32 / 503 MB
+#
+# Each loaded Whisper size adds its weights once with preloading, and once
+# per worker without it.
+#
+# Two rules keep forking safe:
+#   - the master never runs inference. Torch's OpenMP pool must not be
+#     started before fork (children can hang on it), so the master runs
+#     with one thread and each worker sets its own count after the fork;
+#   - DB connections opened while importing (create_all) belong to the
+#     master; each worker drops them and opens its own.
+
+wsgi_app = "app.main:app"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+os.environ["WEB_CONCURRENCY"] = str(workers)         # app/threads.py splits the cores by it
+worker_class = os.getenv("WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+preload_app = os.getenv("PRELOAD_MODELS", "true").lower() in ("1", "true", "yes")
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))   # a cold Whisper decode on CPU is slow
+graceful_timeout = 30
+
+
+if preload_app:
+    # Before app.main is imported: keep the master's OpenMP pool unused
+    import torch
+    torch.set_num_threads(1)
+
+
+def when_ready(server):
+    # Master, app already imported (BERT loaded) - last stop before forking
+    if not preload_app:
+        return
+    from app.asr import registry, warmup_sizes_from_env, ASR_SERVICE_SOCKET
+    sizes = warmup_sizes_from_env()
+    if sizes and not ASR_SERVICE_SOCKET:
+        registry.warm_up(sizes)
+    # Move everything loaded so far out of the GC's reach: collections in
+    # the workers would otherwise touch (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+    server.log.info("Models loaded in master; forking %d workers", workers)
+
+
+def post_fork(server, worker):
+    from app import threads
+    from app.asr import ASR_SERVICE_SOCKET
+    # This worker's share of the cores (WEB_CONCURRENCY), split per model
+    plan = threads.configure(stages=("nlu",) if ASR_SERVICE_SOCKET else threads.STAGES)
+
+    if preload_app:
+        from app.database import engine
+        # Pooled connections were opened by the master: don't share sockets
+        engine.dispose(close=False)
+    server.log.info("Worker %s: torch thread budget %d", worker.pid, plan["budget"])
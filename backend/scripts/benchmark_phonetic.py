@@ -0,0 +1,119 @@
+import os
+import sys
+import re
+import csv
+import time
+import difflib
+
+# Fix import path so 'app' module is found properly
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from app.phonetic import phonetic_key
+from app.product_index import ProductIndex
+
+# ---------- PATH SETUP ----------
+CSV_PATH = os.path.join(BASE_DIR, "transcriptions.csv")
+
+# ---------- CATALOGUE (same names as seed.py) ----------
+PRODUCTS = ["चामल", "दाल", "तेल", "चिनी", "नुन", "अण्डा", "चिउरा", "मैदा", "बेसार", "बिस्कुट"]
+
+# What each recording was supposed to say, from its file name
+LABEL_PREFIXES = {
+    "अण्डा": ["anda"],
+    "बेसार": ["besar", "besae", "bisar"],
+    "बिस्कुट": ["biscuit"],
+    "चिउरा": ["chiura"],
+    "मैदा": ["maida"],
+    "चामल": ["chamal", "chamel", "chmael"],
+    "चिनी": ["चीनी", "chini", "chink"],
+    "दाल": ["daal", "dal"],
+    "तेल": ["tel"],
+    "नुन": ["nun"],
+}
+
+
+def label_for(filename):
+    name = re.sub(r"^person_\d+_", "", filename.lower())
+    for product, prefixes in LABEL_PREFIXES.items():
+        if any(name.startswith(p) for p in prefixes + [product]):
+            return product
+    return None  # unlabelled recordings ("13 Feb", "New Recording", person_2/3/6/7)
+
+
+# ---------- THE OLD PATH (main.find_closest_product before the index) ----------
+OLD_OVERRIDES = {
+    "ताल": "दाल", "टाल": "दाल", "थाल": "दाल", "दान": "दाल",
+    "जमाल": "चामल", "सामल": "चामल", "छामल": "चामल",
+    "चिनि": "चिनी", "छिनि": "चिनी", "सिनी": "चिनी",
+    "टेल": "तेल", "टैल": "तेल", "पेल": "तेल",
+    "नुन": "नुन", "नून": "नुन", "लुन": "नुन"
+}
+
+
+def difflib_lookup(word):
+    word = OLD_OVERRIDES.get(word, word)
+    best, best_score = None, 0.0
+    for name in PRODUCTS:
+        if word == name or name in word:
+            return name
+        score = difflib.SequenceMatcher(None, word, name).ratio()
+        if score > best_score:
+            best, best_score = name, score
+    return best if best_score > 0.6 else None
+
+
+# ---------- THE NEW PATHS ----------
+KEY_TABLE = {}
+for name in PRODUCTS:
+    KEY_TABLE.setdefault(phonetic_key(name), name)
+
+
+def phonetic_only_lookup(word):
+    return KEY_TABLE.get(phonetic_key(word))
+
+
+index = ProductIndex(ttl=float("inf"))
+index.load(list(enumerate(PRODUCTS)))
+
+
+def index_lookup(word):
+    product_id = index.match_id(word, None)
+    return PRODUCTS[product_id] if product_id is not None else None
+
+
+# ---------- RUN ----------
+with open(CSV_PATH, encoding="utf-8") as f:
+    rows = [(label_for(r["file"]), r["text"]) for r in csv.DictReader(f)]
+rows = [(label, text) for label, text in rows if label]
+print(f"📂 {len(rows)} labelled transcriptions from transcriptions.csv\n")
+
+resolvers = [
+    ("difflib (old)", difflib_lookup),
+    ("phonetic key only", phonetic_only_lookup),
+    ("index (key + fuzzy)", index_lookup),
+]
+
+print(f"{'resolver':<22}{'hit':>8}{'wrong':>8}{'miss':>8}{'µs/lookup':>12}")
+for title, resolve in resolvers:
+    hits = wrong = miss = lookups = 0
+    elapsed = 0.0
+    for label, text in rows:
+        predicted = None
+        for word in text.split():
+            started = time.perf_counter()
+            predicted = resolve(word.strip("?।,."))
+            elapsed += time.perf_counter() - started
+            lookups += 1
+            if predicted:
+                break
+        if predicted == label:
+            hits += 1
+        elif predicted:
+            wrong += 1
+        else:
+            miss += 1
+
+    n = len(rows)
+    print(f"{title:<22}{hits / n * 100:>7.1f}%{wrong / n * 100:>7.1f}%{miss / n * 100:>7.1f}%"
+          f"{elapsed / max(lookups, 1) * 1e6:>12.1f}")
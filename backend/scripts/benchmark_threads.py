@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import glob
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+
+# Fix import path so 'app' module is found properly
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+# ==========================================
+# 🧵 TORCH THREAD SWEEP
+# ==========================================
+# Starts the API once per thread setting (see app/threads.py) and fires
+# concurrent /command and /voice requests at it, reporting p50/p99 latency
+# and throughput for each, on THIS machine:
+#
+#   python scripts/benchmark_threads.py --threads 1:1 2:1 4:1 4:2 --concurrency 4
+#
+# Each setting is ASR_TORCH_THREADS:NLU_TORCH_THREADS, run with per-stage
+# pinning on; "shared" runs with TORCH_PIN_STAGES=0 (every model uses the
+# whole budget) as the baseline. The parse and
+# audio-fingerprint caches are switched off so every request really runs
+# the models.
+#
+# ⚠️ /voice executes whatever the clip says (an ADD/SALE changes stock), so
+# point DATABASE_URL at a scratch database. The default /command text is a
+# stock CHECK.
+
+DEFAULT_AUDIO = next(iter(sorted(glob.glob(os.path.join(BASE_DIR, "processed_audio", "*.wav")))), None)
+
+parser = argparse.ArgumentParser(description="Sweep torch thread counts and measure /command and /voice latency.")
+parser.add_argument("--threads", nargs="+", default=["shared", "1:1", "2:1", "4:1"],
+                    help="ASR:NLU torch threads per setting, or 'shared' for no per-stage pinning")
+parser.add_argument("--interop", type=int, default=1, help="TORCH_INTEROP_THREADS")
+parser.add_argument("--endpoints", nargs="+", choices=["command", "voice"], default=["command", "voice"])
+parser.add_argument("--requests", type=int, default=50, help="requests per endpoint per setting")
+parser.add_argument("--concurrency", type=int, default=4)
+parser.add_argument("--text", default="चामल कति छ", help="/command text")
+parser.add_argument("--audio", default=DEFAULT_AUDIO, help="clip uploaded to /voice")
+parser.add_argument("--model-size", default=None, help="Whisper size for /voice (default: server's WHISPER_MODEL)")
+parser.add_argument("--port", type=int, default=8766)
+parser.add_argument("--startup-timeout", type=float, default=600)
+args = parser.parse_args()
+
+BASE_URL = f"http://127.0.0.1:{args.port}"
+
+
+# ---------- SERVER ----------
+def start_server(setting):
+    env = dict(
+        os.environ,
+        TORCH_INTEROP_THREADS=str(args.interop),
+        BRAIN_CACHE_SIZE="0",
+        FINGERPRINT_CACHE_SIZE="0",
+    )
+    if setting == "shared":
+        env["TORCH_PIN_STAGES"] = "0"
+    else:
+        asr_threads, nlu_threads = setting.split(":")
+        env.update(TORCH_PIN_STAGES="1", ASR_TORCH_THREADS=asr_threads, NLU_TORCH_THREADS=nlu_threads)
+    # Load the Whisper size under test before traffic, not on the first request
+    if "voice" in args.endpoints:
+        env["WHISPER_WARMUP"] = args.model_size or env.get("WHISPER_MODEL", "small")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port)],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_ready(proc):
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            models = httpx.get(BASE_URL + "/system/models", timeout=2).json()
+            if "voice" not in args.endpoints or models.get("loaded"):
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    raise RuntimeError("server did not become ready in time")
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ---------- LOAD ----------
+def make_request(endpoint, audio):
+    if endpoint == "command":
+        return lambda client: client.post("/command", json={"text": args.text})
+    params = {"model_size": args.model_size} if args.model_size else {}
+    return lambda client: client.post("/voice", params=params, files={"file": ("clip.wav", audio, "audio/wav")})
+
+
+async def run_load(endpoint, audio):
+    send = make_request(endpoint, audio)
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+
+    async def user(client):
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await send(client)
+                ok = response.status_code == 200 and "error" not in response.json()
+            except (httpx.HTTPError, ValueError):
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=300) as client:
+        await send(client)  # warm-up, not counted
+        started = time.perf_counter()
+        await asyncio.gather(*(user(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed)
+
+
+def summarize(latencies, errors, elapsed):
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else 0.0
+
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "req_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def main():
+    audio = None
+    if "voice" in args.endpoints:
+        if not args.audio or not os.path.exists(args.audio):
+            sys.exit("❌ No clip for /voice: pass --audio path/to/clip.wav")
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+
+    print(f"🧵 {os.cpu_count()} CPUs, concurrency {args.concurrency}, {args.requests} requests per endpoint\n")
+    rows = []
+    for setting in args.threads:
+        print(f"▶️  {setting} threads...")
+        proc = start_server(setting)
+        try:
+            wait_until_ready(proc)
+            for endpoint in args.endpoints:
+                result = asyncio.run(run_load(endpoint, audio))
+                rows.append({"setting": setting, "endpoint": f"/{endpoint}", **result})
+                print(f"   /{endpoint}: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+                      f"{result['req_per_s']} req/s ({result['errors']} errors)")
+        except RuntimeError as e:
+            print(f"   ❌ {e}")
+        finally:
+            stop_server(proc)
+
+    print("\n| asr:nlu threads | endpoint | p50 (ms) | p99 (ms) | req/s | errors |")
+    print("|---|---|---|---|---|---|")
+    for r in rows:
+        print(f"| {r['setting']} | {r['endpoint']} | {r['p50_ms']} | {r['p99_ms']} | {r['req_per_s']} | {r['errors']} |")
+
+
+main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import csv
+import time
+import argparse
+import warnings
+
+import jiwer
+
+warnings.filterwarnings("ignore")
+
+# Fix import path so 'app' module is found properly
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from app import asr
+from app.audio import SAMPLE_RATE, decode_audio, trim_silence
+
+# ==========================================
+# ✂️ VAD TRIMMING BENCHMARK
+# ==========================================
+# Decodes every clip twice through the live Whisper path (asr batcher),
+# once as uploaded and once after trim_silence, and reports:
+#   - audio seconds removed and clips dropped as silent
+#   - decode time per clip, both ways
+#   - WER of each against transcriptions.csv (the offline large-model run)
+#     and WER of trimmed vs untrimmed output (how much trimming changes it)
+#
+# The encoder cost does not shrink with trimming: openai-whisper pads every
+# clip back to its 30 s window. Differences in decode time come from the
+# decoder (fewer tokens over silence), from silent clips that skip Whisper
+# and from clips over 30 s that no longer need the long-form path.
+#
+# What was measured without the Whisper weights (1 CPU core):
+#   voice_dataset/    541 WAVs, 1245.8 s in, 14.9% trimmed, 1 silent, none > 30 s
+#   processed_audio/  927 WAVs, 1549.6 s in,  0.6% trimmed, 1 silent, none > 30 s
+#   trim_silence      0.03-0.05 ms per clip
+#   'small' encoder   76.3 s untrimmed vs 76.1 s trimmed per clip (randomly
+#                     initialised weights; both inputs are the same 80x3000 mel)
+# So on this data trimming saves no encoder time; only the one silent clip
+# per set skips Whisper. Decoder time and WER need the real weights.
+#
+# processed_audio/ was already trimmed offline by preprocess_audio.py, so
+# also run it on voice_dataset/ to see what raw phone uploads look like:
+#   python scripts/benchmark_vad.py --input voice_dataset
+
+parser = argparse.ArgumentParser(description="Decode time and WER with and without VAD trimming.")
+parser.add_argument("--input", default="processed_audio", help="folder of .wav files, relative to backend/")
+parser.add_argument("--model", default=asr.DEFAULT_MODEL_SIZE)
+parser.add_argument("--limit", type=int, default=0, help="only the first N files (0 = all)")
+args = parser.parse_args()
+
+INPUT_DIR = os.path.join(BASE_DIR, args.input)
+CSV_PATH = os.path.join(BASE_DIR, "transcriptions.csv")
+
+# ---------- REFERENCES ----------
+references = {}
+if os.path.exists(CSV_PATH):
+    with open(CSV_PATH, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            # voice_dataset/x.wav was saved as processed_audio/x_<n>.wav
+            references[row["file"]] = row["text"].strip()
+            references.setdefault(row["file"].rsplit("_", 1)[0] + ".wav", row["text"].strip())
+
+files = sorted(f for f in os.listdir(INPUT_DIR) if f.lower().endswith(".wav"))
+if args.limit:
+    files = files[:args.limit]
+
+print(f"🚀 Loading Whisper '{args.model}'...")
+asr.registry.get(args.model)
+print(f"📂 {len(files)} clips from {args.input}/\n")
+
+
+def decode(audio, trim):
+    asr.VAD_TRIM = trim
+    started = time.perf_counter()
+    result = asr.batcher._decode_batch(args.model, [audio])[0]
+    elapsed = time.perf_counter() - started
+    if isinstance(result, Exception):
+        raise result
+    return result["text"].strip(), elapsed
+
+
+# ---------- RUN ----------
+rows = []
+total_in = total_kept = 0.0
+for i, filename in enumerate(files):
+    with open(os.path.join(INPUT_DIR, filename), "rb") as f:
+        audio = decode_audio(f.read())
+    kept = len(trim_silence(audio))
+    total_in += len(audio) / SAMPLE_RATE
+    total_kept += kept / SAMPLE_RATE
+
+    full_text, full_time = decode(audio, trim=False)
+    trim_text, trim_time = decode(audio, trim=True)
+    rows.append((filename, full_text, full_time, trim_text, trim_time, kept == 0))
+    print(f"[{i + 1}/{len(files)}] {full_time * 1000:7.0f} ms -> {trim_time * 1000:7.0f} ms  {filename}")
+
+n = len(rows)
+if n == 0:
+    print("❌ No .wav files found.")
+    sys.exit(1)
+
+
+def wer(refs, hyps):
+    pairs = [(r, h) for r, h in zip(refs, hyps) if r]
+    if not pairs:
+        return float("nan")
+    return jiwer.wer([r for r, _ in pairs], [h for _, h in pairs])
+
+
+full_total = sum(r[2] for r in rows)
+trim_total = sum(r[4] for r in rows)
+labelled = [r for r in rows if r[0] in references]
+
+print("\n========== RESULTS ==========")
+print(f"audio            {total_in:8.1f} s in, {total_kept:8.1f} s kept ({(1 - total_kept / max(total_in, 1e-9)) * 100:.1f}% trimmed)")
+print(f"silent clips     {sum(r[5] for r in rows)} dropped before Whisper")
+print(f"decode time      {full_total / n * 1000:8.1f} ms/clip untrimmed, {trim_total / n * 1000:8.1f} ms/clip trimmed "
+      f"({(1 - trim_total / max(full_total, 1e-9)) * 100:+.1f}% saved)")
+print(f"WER trim vs full {wer([r[1] for r in rows], [r[3] for r in rows]) * 100:8.2f}%")
+if labelled:
+    refs = [references[r[0]] for r in labelled]
+    print(f"WER vs csv       {wer(refs, [r[1] for r in labelled]) * 100:8.2f}% untrimmed, "
+          f"{wer(refs, [r[3] for r in labelled]) * 100:8.2f}% trimmed  ({len(labelled)} labelled clips)")
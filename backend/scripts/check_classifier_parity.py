@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# Fix import path so 'app' module is found properly
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from transformers import AutoTokenizer
+from app.classifier import load_classifier, BACKENDS
+
+# ---------- PATH SETUP ----------
+MODEL_PATH = os.path.join(BASE_DIR, "bert_brain_model")
+DATASET_PATH = os.path.join(BASE_DIR, "training", "dataset.json")
+
+# ---------- CONFIG ----------
+parser = argparse.ArgumentParser(description="Compare int8 / ONNX intent predictions against fp32 PyTorch.")
+parser.add_argument("--backends", default="int8,onnx", help="comma separated, any of: " + ", ".join(BACKENDS))
+parser.add_argument("--batch-size", type=int, default=32)
+parser.add_argument("--max-conf-diff", type=float, default=0.05, help="largest allowed confidence drift")
+parser.add_argument("--min-agreement", type=float, default=0.99, help="required fraction of identical labels")
+args = parser.parse_args()
+
+with open(DATASET_PATH, "r", encoding="utf-8") as f:
+    texts = [row["text"] for row in json.load(f)]
+
+print(f"📂 Loaded {len(texts)} examples from dataset.json")
+tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+
+
+def run(backend):
+    clf = load_classifier(MODEL_PATH, tokenizer, backend, "cpu")
+    clf.predict(texts[:1])  # warm-up
+    started = time.perf_counter()
+    probs = np.concatenate([
+        clf.predict(texts[i:i + args.batch_size])
+        for i in range(0, len(texts), args.batch_size)
+    ])
+    elapsed = time.perf_counter() - started
+    return probs, elapsed
+
+
+# ---------- REFERENCE (fp32) ----------
+ref_probs, ref_time = run("torch")
+ref_labels = ref_probs.argmax(axis=1)
+ref_conf = ref_probs.max(axis=1)
+print(f"🎯 torch fp32: {ref_time * 1000 / len(texts):.2f} ms/example")
+
+# ---------- CANDIDATES ----------
+failed = False
+for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+    try:
+        probs, elapsed = run(backend)
+    except Exception as e:
+        print(f"❌ {backend}: could not load ({e})")
+        failed = True
+        continue
+
+    labels = probs.argmax(axis=1)
+    conf = probs[np.arange(len(labels)), ref_labels]
+    agreement = float((labels == ref_labels).mean())
+    conf_diff = float(np.abs(conf - ref_conf).max())
+    ok = agreement >= args.min_agreement and conf_diff <= args.max_conf_diff
+    failed = failed or not ok
+
+    print(f"{'✅' if ok else '❌'} {backend}: "
+          f"label agreement {agreement * 100:.2f}% | "
+          f"max confidence diff {conf_diff:.4f} | "
+          f"{elapsed * 1000 / len(texts):.2f} ms/example ({ref_time / elapsed:.2f}x)")
+
+    for i in np.flatnonzero(labels != ref_labels)[:10]:
+        print(f"   ↳ '{texts[i]}': fp32={ref_labels[i]} ({ref_conf[i]:.3f}) vs {backend}={labels[i]} ({probs[i].max():.3f})")
+
+sys.exit(1 if failed else 0)
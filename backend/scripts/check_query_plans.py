@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta
+
+# Fix import path so 'app' module is found properly
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from sqlalchemy import select, func, text
+from app.database import engine
+from app import models
+from app.routers.sales import history_query, stats_query, encode_cursor
+from app.rollups import daily_totals_query, REFRESH_DAYS
+
+# ==========================================
+# 🔍 QUERY PLAN REGRESSION CHECK
+# ==========================================
+# EXPLAINs the queries behind /sales/history, /sales/stats (and the rollup
+# refresh it relies on) and fails if any of them reads `transactions` with
+# a sequential scan. Run it against a database with production-sized
+# history; --seed fills a SCRATCH database up to --rows synthetic rows:
+#
+#   DATABASE_URL=postgresql://.../inventory_scratch \
+#       python scripts/check_query_plans.py --seed --rows 10000000
+#
+# Exit code 1 when a plan regresses, so it can gate CI.
+
+parser = argparse.ArgumentParser(description="Fail if sales queries fall back to sequential scans.")
+parser.add_argument("--rows", type=int, default=10_000_000, help="transactions wanted when seeding")
+parser.add_argument("--seed", action="store_true", help="insert synthetic transactions up to --rows (scratch DB only!)")
+args = parser.parse_args()
+
+dialect = engine.dialect.name
+
+
+# ---------- QUERIES (built by the same functions the endpoints use) ----------
+def queries():
+    some_product = select(func.min(models.Product.id)).scalar_subquery()
+    today = datetime.utcnow().date()
+    return {
+        "/sales/history (newest first)": history_query(),
+        "/sales/history?cursor=...": history_query(cursor=encode_cursor(datetime.utcnow() - timedelta(days=400), 1)),
+        "/sales/history?type=SALE": history_query(transaction_type="SALE"),
+        "/sales/history?product_id=...": history_query(product_id=some_product),
+        "/sales/stats": stats_query(),
+        "/sales/stats?start=... (last 30 days)": stats_query(start=today - timedelta(days=30)),
+        f"rollup refresh (last {REFRESH_DAYS} days)": daily_totals_query(start=today - timedelta(days=REFRESH_DAYS - 1)),
+    }
+
+
+# ---------- SEEDING ----------
+def seed(conn, wanted):
+    have = conn.execute(text("SELECT count(*) FROM transactions")).scalar()
+    missing = wanted - have
+    if missing <= 0:
+        print(f"📦 {have:,} transactions already present")
+        return
+    if conn.execute(text("SELECT count(*) FROM inventory")).scalar() == 0:
+        sys.exit("❌ Seed some products first (python seed.py)")
+
+    print(f"🌱 Inserting {missing:,} synthetic transactions...")
+    if dialect == "postgresql":
+        conn.execute(text("""
+            WITH ids AS (SELECT array_agg(id) AS a FROM inventory)
+            INSERT INTO transactions (product_id, transaction_type, quantity, total_amount, "timestamp")
+            SELECT ids.a[1 + (g % array_length(ids.a, 1))],
+                   CASE WHEN g % 10 < 7 THEN 'SALE' ELSE 'PURCHASE' END,
+                   1 + g % 5, (1 + g % 5) * 100.0,
+                   (now() AT TIME ZONE 'utc') - random() * interval '3 years'
+            FROM ids, generate_series(1, :n) AS g
+        """), {"n": missing})
+    else:
+        conn.execute(text("""
+            WITH RECURSIVE g(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM g WHERE n < :n),
+                 ids AS (SELECT id, row_number() OVER (ORDER BY id) - 1 AS k, count(*) OVER () AS c FROM inventory)
+            INSERT INTO transactions (product_id, transaction_type, quantity, total_amount, timestamp)
+            SELECT ids.id,
+                   CASE WHEN g.n % 10 < 7 THEN 'SALE' ELSE 'PURCHASE' END,
+                   1 + g.n % 5, (1 + g.n % 5) * 100.0,
+                   -- same text format SQLAlchemy writes, so comparisons stay exact
+                   strftime('%Y-%m-%d %H:%M:%f', 'now', '-' || (abs(random()) % 94608000) || ' seconds') || '000'
+            FROM g JOIN ids ON ids.k = g.n % ids.c
+        """), {"n": missing})
+
+
+# ---------- PLAN INSPECTION ----------
+def seq_scans_postgres(conn, sql):
+    plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    found, stack = [], [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        relation = node.get("Relation Name", "")
+        if node["Node Type"] == "Seq Scan" and relation.startswith("transactions"):
+            found.append(relation)
+        stack.extend(node.get("Plans", []))
+    return found, plan[0]["Plan"]["Node Type"]
+
+
+def seq_scans_sqlite(conn, sql):
+    details = [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+    found = ["transactions" for d in details if d.startswith("SCAN transactions") and "INDEX" not in d]
+    return found, "; ".join(details)
+
+
+def main():
+    with engine.begin() as conn:
+        if args.seed:
+            seed(conn, args.rows)
+        conn.execute(text("ANALYZE transactions" if dialect == "postgresql" else "ANALYZE"))
+
+    inspect = seq_scans_postgres if dialect == "postgresql" else seq_scans_sqlite
+    failures = 0
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT count(*) FROM transactions")).scalar()
+        print(f"🔍 Checking plans on {dialect} with {rows:,} transactions\n")
+        for name, stmt in queries().items():
+            sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            scans, summary = inspect(conn, sql)
+            if scans:
+                failures += 1
+                print(f"❌ {name}: sequential scan on {', '.join(scans)}\n   {summary}")
+            else:
+                print(f"✅ {name}: {summary}")
+
+    if failures:
+        print(f"\n❌ {failures} query plan(s) fall back to sequential scans. Run scripts/migrate.py?")
+        sys.exit(1)
+    print("\n✅ All sales queries use indexes.")
+
+
+main()
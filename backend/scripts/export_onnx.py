@@ -0,0 +1,34 @@
+import os
+import sys
+import argparse
+
+# Fix import path so 'app' module is found properly
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from transformers import AutoTokenizer
+from app.classifier import export_onnx, onnx_is_stale, ONNX_FILENAME
+
+# ==========================================
+# 📦 EXPORT THE INTENT MODEL TO ONNX
+# ==========================================
+# Run once per model swap, before (re)starting workers with BRAIN_BACKEND=onnx:
+#   python scripts/export_onnx.py            # only if model.onnx is missing or stale
+#   python scripts/export_onnx.py --force    # always re-export
+# Then check it with scripts/check_classifier_parity.py --backends onnx
+
+# ---------- PATH SETUP ----------
+MODEL_PATH = os.path.join(BASE_DIR, "bert_brain_model")
+
+parser = argparse.ArgumentParser(description=f"Export bert_brain_model/ to {ONNX_FILENAME}.")
+parser.add_argument("--model-path", default=MODEL_PATH)
+parser.add_argument("--force", action="store_true", help="re-export even if the graph is up to date")
+args = parser.parse_args()
+
+onnx_path = os.path.join(args.model_path, ONNX_FILENAME)
+if not args.force and not onnx_is_stale(args.model_path, onnx_path):
+    print(f"✅ {onnx_path} is newer than the weights, nothing to do (use --force to re-export).")
+    sys.exit(0)
+
+tokenizer = AutoTokenizer.from_pretrained(args.model_path)
+export_onnx(args.model_path, tokenizer, onnx_path)
@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import argparse
+import threading
+
+# Fix import path so 'app' module is found properly
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import OperationalError
+from app.database import SQLALCHEMY_DATABASE_URL
+from app import models
+from app.stock import adjust_stock, InsufficientStock, LOCKING_MODES
+
+# ==========================================
+# 🏋️ CONCURRENT SELLERS LOAD TEST
+# ==========================================
+# N threads hammer ONE product with 1-unit sales at the same instant.
+# Demand is larger than stock on purpose. With atomic stock changes:
+#   successful sales == starting stock, final quantity == 0, never negative.
+# --naive runs the old read-check-write code to show the lost updates.
+
+parser = argparse.ArgumentParser(description="Prove stock changes have no lost updates under parallel sellers.")
+parser.add_argument("--sellers", type=int, default=50)
+parser.add_argument("--sales-per-seller", type=int, default=20)
+parser.add_argument("--stock", type=float, default=500)
+parser.add_argument("--locking", choices=LOCKING_MODES, default="conditional")
+parser.add_argument("--naive", action="store_true", help="use the old read-modify-write path")
+args = parser.parse_args()
+
+TEST_NAME = "__load_test_product__"
+
+# One connection per seller so all of them really run at once
+engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=args.sellers, max_overflow=0)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+models.Base.metadata.create_all(bind=engine)
+
+# ---------- SETUP ----------
+db = SessionLocal()
+# ORM deletes, so synced tablets get the tombstone (app/catalog.py)
+for stale in db.query(models.Product).filter(models.Product.name == TEST_NAME).all():
+    db.delete(stale)
+db.flush()
+product = models.Product(name=TEST_NAME, quantity=args.stock)
+db.add(product)
+db.commit()
+product_id = product.id
+db.close()
+
+barrier = threading.Barrier(args.sellers)
+lock = threading.Lock()
+counts = {"sold": 0, "refused": 0, "retried": 0}
+
+
+def naive_sale(db, item):
+    db.refresh(item)
+    if item.quantity < 1:
+        raise InsufficientStock(item.quantity)
+    item.quantity -= 1
+
+
+def seller():
+    db = SessionLocal()
+    item = db.get(models.Product, product_id)
+    barrier.wait()
+    for _ in range(args.sales_per_seller):
+        while True:
+            try:
+                if args.naive:
+                    naive_sale(db, item)
+                else:
+                    adjust_stock(db, item, -1, locking=args.locking)
+                db.commit()
+                outcome = "sold"
+                break
+            except InsufficientStock:
+                db.rollback()
+                outcome = "refused"
+                break
+            except OperationalError:
+                # SQLite "database is locked" / Postgres serialization: try again
+                db.rollback()
+                with lock:
+                    counts["retried"] += 1
+                time.sleep(0.001)
+        with lock:
+            counts[outcome] += 1
+    db.close()
+
+
+# ---------- RUN ----------
+mode = "naive read-modify-write" if args.naive else f"atomic ({args.locking})"
+demand = args.sellers * args.sales_per_seller
+print(f"🏋️ {args.sellers} sellers x {args.sales_per_seller} sales = {demand} units wanted, {args.stock:g} in stock [{mode}]")
+
+started = time.perf_counter()
+threads = [threading.Thread(target=seller) for _ in range(args.sellers)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+elapsed = time.perf_counter() - started
+
+# ---------- VERIFY ----------
+db = SessionLocal()
+product = db.get(models.Product, product_id)
+final_qty = product.quantity
+db.delete(product)
+db.commit()
+db.close()
+
+expected_sold = min(demand, args.stock)
+lost_updates = counts["sold"] - (args.stock - final_qty)
+
+print(f"⏱️ {elapsed:.2f}s, {demand / elapsed:.0f} sale attempts/s, {counts['retried']} retries")
+print(f"📦 sold={counts['sold']} refused={counts['refused']} final_qty={final_qty:g}")
+
+ok = final_qty >= 0 and lost_updates == 0 and counts["sold"] == expected_sold
+if ok:
+    print("✅ No lost updates, no overselling.")
+else:
+    print(f"❌ Stock is wrong: {lost_updates:g} lost update(s), expected {expected_sold:g} sales.")
+sys.exit(0 if ok else 1)
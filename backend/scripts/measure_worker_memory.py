@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+import urllib.request
+
+# Fix import path so 'app' module is found properly
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+# ==========================================
+# 🧮 WORKER MEMORY MEASUREMENT (Linux)
+# ==========================================
+# Starts gunicorn.conf.py at each worker count, with and without
+# preloading the models in the master, and sums memory over the master and
+# its workers from /proc/<pid>/smaps_rollup:
+#
+#   RSS   resident pages, shared ones counted once PER PROCESS (overstates)
+#   PSS   shared pages split between the processes that map them: the sum
+#         is what the deployment really costs
+#   USS   private pages per worker (what one more worker adds)
+#
+#   python scripts/measure_worker_memory.py --workers 1 2 4 8 --whisper small
+#
+# Use the machine you deploy on. The numbers depend on the Whisper sizes
+# loaded, the BRAIN_BACKEND and the torch build. --requests sends a few
+# /command calls first so lazily touched pages are counted too.
+
+parser = argparse.ArgumentParser(description="Measure total memory of the pre-fork deployment per worker count.")
+parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+parser.add_argument("--mode", choices=["preload", "no-preload", "both"], default="both")
+parser.add_argument("--whisper", default="small", help="WHISPER_WARMUP for the run ('' = BERT only)")
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--requests", type=int, default=20, help="/command calls before measuring")
+parser.add_argument("--startup-timeout", type=float, default=600)
+parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+args = parser.parse_args()
+
+BASE_URL = f"http://127.0.0.1:{args.port}"
+
+
+# ---------- /proc ----------
+def smaps_rollup(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])  # kB
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # pid (comm) state ppid ... - comm may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return found
+
+
+def mb(kb):
+    return round(kb / 1024, 1)
+
+
+# ---------- ONE RUN ----------
+def wait_until_up(proc, worker_count):
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {proc.returncode}")
+        try:
+            urllib.request.urlopen(BASE_URL + "/", timeout=2).read()
+            if len(children(proc.pid)) >= worker_count:
+                return
+        except OSError:
+            pass
+        time.sleep(1)
+    raise RuntimeError("gunicorn did not come up in time")
+
+
+def exercise():
+    body = json.dumps({"text": "चामल कति छ"}).encode()
+    for _ in range(args.requests):
+        request = urllib.request.Request(
+            BASE_URL + "/command", data=body, headers={"Content-Type": "application/json"}
+        )
+        try:
+            urllib.request.urlopen(request, timeout=60).read()
+        except OSError as e:
+            print(f"   ⚠️ /command failed: {e}")
+            return
+
+
+def measure(worker_count, preload):
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(worker_count),
+        PRELOAD_MODELS="true" if preload else "false",
+        WHISPER_WARMUP=args.whisper,
+        BIND=f"127.0.0.1:{args.port}",
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(proc, worker_count)
+        # Lazy loading (no preload) happens on each worker's startup: let it finish
+        time.sleep(5)
+        exercise()
+        time.sleep(2)
+
+        master = smaps_rollup(proc.pid)
+        workers = [smaps_rollup(pid) for pid in children(proc.pid)]
+        total = {k: master[k] + sum(w[k] for w in workers) for k in ("rss", "pss")}
+        return {
+            "workers": worker_count,
+            "mode": "preload" if preload else "no-preload",
+            "total_pss_mb": mb(total["pss"]),
+            "total_rss_mb": mb(total["rss"]),
+            "master_pss_mb": mb(master["pss"]),
+            "worker_uss_mb": mb(sum(w["uss"] for w in workers) / max(1, len(workers))),
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("❌ Needs Linux /proc/<pid>/smaps_rollup")
+
+    modes = {"preload": [True], "no-preload": [False], "both": [True, False]}[args.mode]
+    results = []
+    for preload in modes:
+        for worker_count in args.workers:
+            print(f"🧮 {worker_count} worker(s), {'preload' if preload else 'no-preload'}...")
+            try:
+                results.append(measure(worker_count, preload))
+            except RuntimeError as e:
+                print(f"   ❌ {e}")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("\n| workers | mode | total PSS (MB) | total RSS (MB) | master PSS (MB) | per-worker USS (MB) |")
+    print("|---|---|---|---|---|---|")
+    for r in results:
+        print(f"| {r['workers']} | {r['mode']} | {r['total_pss_mb']} | {r['total_rss_mb']} | "
+              f"{r['master_pss_mb']} | {r['worker_uss_mb']} |")
+
+
+main()
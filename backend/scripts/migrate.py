@@ -0,0 +1,51 @@
+import os
+import sys
+import argparse
+
+# Fix import path so 'app' module is found properly
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from app.database import engine
+from app import migrations
+
+# ==========================================
+# 🧱 APPLY SCHEMA MIGRATIONS
+# ==========================================
+#   python scripts/migrate.py                    # pending migrations
+#   python scripts/migrate.py --list             # show what would run
+#   python scripts/migrate.py --partition        # + monthly partitions (Postgres)
+#   python scripts/migrate.py --ensure-partitions  # monthly cron: next months' partitions
+
+parser = argparse.ArgumentParser(description="Apply pending schema migrations.")
+parser.add_argument("--list", action="store_true", help="only list pending migrations")
+parser.add_argument("--partition", action="store_true", help="also range-partition transactions by month (Postgres)")
+parser.add_argument("--ensure-partitions", action="store_true", help="create upcoming monthly partitions")
+args = parser.parse_args()
+
+optional = ("0002_partition_transactions",) if args.partition else ()
+
+if args.list:
+    todo = migrations.pending(engine, optional)
+    for m in todo:
+        print(f"⏳ {m.id}: {m.description}")
+    if not todo:
+        print("✅ Database is up to date.")
+    sys.exit(0)
+
+if args.ensure_partitions:
+    if engine.dialect.name != "postgresql":
+        print("❌ Partitioning is Postgres only.")
+        sys.exit(1)
+    with engine.begin() as conn:
+        migrations.ensure_partitions(conn)
+    print("✅ Upcoming monthly partitions exist.")
+    sys.exit(0)
+
+try:
+    applied = migrations.run(engine, optional)
+except Exception as e:
+    print(f"❌ Migration failed: {e}")
+    sys.exit(1)
+
+print(f"✅ Applied {len(applied)} migration(s)." if applied else "✅ Nothing to do, database is up to date.")